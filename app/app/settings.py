@@ -11,6 +11,10 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,13 +43,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
+    'core.apps.CoreConfig',
     'user',
-    'recipe'
+    'recipe.apps.RecipeConfig'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.AccessLogMiddleware',
+    'core.middleware.ProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +82,16 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Warm up the WSGI module before workers fork from it, for prefork
+# servers that load the app once in their master (gunicorn --preload)
+WSGI_PRELOAD = os.environ.get('WSGI_PRELOAD', '') == '1'
+# Modules imported on first use that a preloading master loads up front
+PRELOAD_MODULES = [
+    'numpy',
+    'PIL.Image',
+    'recipe.tasks',
+]
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -88,6 +106,160 @@ DATABASES = {
     }
 }
 
+# Read replicas of the primary, e.g. DB_REPLICA_HOSTS=replica1,replica2
+# Clients are pinned to the primary after writing through the default
+# cache, so replicas need a cache shared by all workers (see below)
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(alias)
+
+# Databases holding recipe data, users are spread over them by a
+# consistent hash of their id, e.g. DB_SHARD_NAMES=app_shard_1,app_shard_2
+DATABASE_SHARDS = ['default']
+for name in filter(None, os.environ.get('DB_SHARD_NAMES', '').split(',')):
+    DATABASES[name] = dict(DATABASES['default'], NAME=name)
+    DATABASE_SHARDS.append(name)
+
+DATABASE_ROUTERS = [
+    'core.sharding.ShardRouter',
+    'core.dbrouters.ReplicaRouter',
+]
+
+# Seconds a client keeps reading from the primary after it wrote
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.environ.get('DB_REPLICA_PIN_SECONDS', 5)
+)
+# Seconds an unreachable replica is skipped before it is tried again
+DATABASE_REPLICA_RETRY_SECONDS = 30
+
+
+# Cache
+# LocMemCache is private to each worker process, anything shared by
+# workers (rate limits, replica pins) needs a shared backend such as
+# memcached in production
+
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    # Rate limit buckets, only hold across workers on a shared backend
+    'throttle': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'KEY_PREFIX': 'throttle',
+    },
+}
+
+if DATABASE_REPLICAS and CACHE_BACKEND.endswith('.LocMemCache'):
+    raise ImproperlyConfigured(
+        'DB_REPLICA_HOSTS needs a CACHE_BACKEND shared by all workers, '
+        'with LocMemCache a client may not read its own writes'
+    )
+
+
+# Django REST framework
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '120/min',
+        'upload': '30/min',
+        'login': '20/min',
+    },
+}
+
+
+# Response compression
+# Brotli (br) and Zstandard (zstd) are used when the brotli and zstandard
+# packages are installed, gzip always is. See `manage.py
+# benchmark_compression` for what each level costs and saves.
+
+COMPRESSION_CODECS = ('br', 'zstd', 'gzip')
+COMPRESSION_LEVELS = {
+    'gzip': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'br': int(os.environ.get('COMPRESSION_BROTLI_LEVEL', 4)),
+    'zstd': int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3)),
+}
+# Bodies smaller than this many bytes are not worth compressing
+COMPRESSION_MIN_SIZE = 1024
+
+
+# Access log and request metrics
+# Each request is logged as one JSON line to the `app.access` logger and
+# timed per route, the histograms are served in the Prometheus text
+# format at /metrics. Requests slower than SLOW_REQUEST_SECONDS are
+# logged to `app.slow_requests` with their slowest queries and sampled
+# stacks, 0 turns that off.
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+SLOW_REQUEST_SAMPLE_INTERVAL = 0.01
+SLOW_REQUEST_MAX_QUERIES = 500
+SLOW_REQUEST_TOP_QUERIES = 10
+SLOW_REQUEST_TOP_STACKS = 20
+# Bearer token /metrics asks for. Without one /metrics is forbidden
+# unless METRICS_PUBLIC=1 opens it (scraped on a private network)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'json': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'app.access': {
+            'handlers': ['json'],
+            'level': os.environ.get('ACCESS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'app.slow_requests': {
+            'handlers': ['json'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Profiling live workers
+# With REQUEST_PROFILING on, staff can get the profile of a request in
+# the folded stack format of flamegraph tools by sending it with an
+# `X-Profile: 1` header or `profile=1` in the query string. `manage.py
+# profile_worker <pid>` samples a whole worker process for a while; it
+# signals the worker with PROFILE_SIGNAL and they exchange files in
+# PROFILE_DIR. Workers only handle the signal when it is set, SIGPROF is
+# a good choice as prefork servers such as gunicorn keep the SIGUSR
+# signals for themselves.
+
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '') == '1'
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_SIGNAL = os.environ.get('PROFILE_SIGNAL', '')
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'app-profiles')
+)
+PROFILE_MAX_SECONDS = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,9 +298,104 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
-MEDIA_URL = '/media/'
+MEDIA_URL = os.environ.get('MEDIA_URL', '/media/')
 
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+
+# Media storage
+# Use core.storage.S3ObjectStorage to keep media in an S3-compatible bucket
+
+DEFAULT_FILE_STORAGE = os.environ.get(
+    'MEDIA_STORAGE',
+    'core.storage.LocalObjectStorage'
+)
+MEDIA_STORAGE_BUCKET = os.environ.get('MEDIA_STORAGE_BUCKET')
+MEDIA_STORAGE_ENDPOINT_URL = os.environ.get('MEDIA_STORAGE_ENDPOINT_URL')
+MEDIA_STORAGE_REGION = os.environ.get('MEDIA_STORAGE_REGION')
+MEDIA_STORAGE_ACCESS_KEY = os.environ.get('MEDIA_STORAGE_ACCESS_KEY')
+MEDIA_STORAGE_SECRET_KEY = os.environ.get('MEDIA_STORAGE_SECRET_KEY')
+# Media names are never reused, so caches may keep files for good
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Seconds a presigned direct upload URL stays valid
+MEDIA_UPLOAD_URL_EXPIRES = int(
+    os.environ.get('MEDIA_UPLOAD_URL_EXPIRES', 15 * 60)
+)
+
 AUTH_USER_MODEL = 'core.User'
+
+
+# Background jobs
+
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 1))
+JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 4))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+# Seconds a claimed job stays hidden before another worker may retry it
+JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 300))
+# Base delay in seconds between retries, doubled after every attempt
+JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF', 30))
+
+# Longest edge in pixels of each resized copy made for recipe images
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': 200,
+    'medium': 800,
+}
+
+# Limits enforced while a recipe image upload is streamed in
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+)
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Most recipes a single batch read may ask for
+RECIPE_BATCH_MAX_IDS = 200
+
+# Most changed objects returned by one call of the sync API
+SYNC_PAGE_SIZE = 500
+
+# Most tags or ingredients created by one bulk request
+RECIPE_ATTR_BULK_MAX = 1000
+
+# Most recipes changed by one bulk update request
+RECIPE_BULK_UPDATE_MAX = 500
+
+# Admin changelists show the planner's estimate above this many rows
+ADMIN_EXACT_COUNT_MAX = 10000
+
+# Users whose similar recipe index each process keeps in memory
+RECIPE_SIMILARITY_MAX_INDEXES = int(
+    os.environ.get('RECIPE_SIMILARITY_MAX_INDEXES', 100)
+)
+# Seconds after which an index is rebuilt. Changes made by other workers
+# are seen at once through the default cache when it is shared, this
+# bounds how long they go unseen when it is not (LocMemCache)
+RECIPE_SIMILARITY_MAX_AGE = int(
+    os.environ.get('RECIPE_SIMILARITY_MAX_AGE', 300)
+)
+# Most similar recipes returned by one request
+RECIPE_SIMILAR_MAX_LIMIT = 100
+
+# Pages of recipe results such as pantry matches
+RECIPE_PAGE_SIZE = 20
+RECIPE_MAX_PAGE_SIZE = 100
+
+# Most ingredients a pantry match may be given
+RECIPE_PANTRY_MAX_INGREDIENTS = 1000
+
+# Seconds the recipe stats of a user may lag behind a change, changes
+# within that window are summarized by one refresh
+RECIPE_STATS_REFRESH_DELAY = int(
+    os.environ.get('RECIPE_STATS_REFRESH_DELAY', 60)
+)
+# Tags and ingredients listed in the recipe stats
+RECIPE_STATS_TOP = 10
+
+# Seconds deleted recipes wait before the purge job removes their rows and
+# images, deletes within that window are purged by one job
+RECIPE_PURGE_DELAY = int(os.environ.get('RECIPE_PURGE_DELAY', 60))
+# Rows deleted per transaction by the purge and user deletion jobs
+RECIPE_PURGE_BATCH_SIZE = 500
@@ -0,0 +1,46 @@
+"""Settings for workers that only serve the token authenticated API
+
+Run them with DJANGO_SETTINGS_MODULE=app.settings_api. The admin,
+sessions, messages and templates are left out, along with the
+middleware that only serves them. Use `manage.py bench_overhead` to
+compare this profile with the full one.
+"""
+from app.settings import *  # noqa: F401,F403
+from app.settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    )
+]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+TEMPLATES = []
+
+# Token authentication and JSON only, no session or browsable API
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.TokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+    ),
+}
@@ -0,0 +1,38 @@
+"""Settings for running the test suite
+
+Used by `manage.py test` unless DJANGO_SETTINGS_MODULE says otherwise.
+"""
+import tempfile
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import LOGGING, REST_FRAMEWORK
+
+
+# Hashing with PBKDF2 dominates the cost of creating users
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='recipe-test-media-')
+
+# Tests of rate limiting set their own rates
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {
+        scope: '100000/min'
+        for scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    },
+}
+
+# Keep the access log of test requests out of the test output
+LOGGING = {
+    **LOGGING,
+    'loggers': {
+        **LOGGING['loggers'],
+        'app.access': {**LOGGING['loggers']['app.access'],
+                       'level': 'WARNING'},
+    },
+}
+
+TEST_RUNNER = 'core.test_runner.TimedTestRunner'
+
+# Seconds the whole suite should finish in, slower runs get a warning
+TEST_WALL_CLOCK_TARGET = 60
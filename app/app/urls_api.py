@@ -0,0 +1,29 @@
+"""URL configuration of API only workers, see `app.settings_api`
+
+The full configuration in `app.urls` adds the admin on top.
+"""
+import re
+
+from django.urls import path, re_path, include
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, get_storage_class
+
+from core import views as core_views
+
+urlpatterns = [
+    path('storage/upload/<str:token>/', core_views.storage_upload,
+         name='storage-upload'),
+    path('api/user/', include('user.urls')),
+    path('api/recipe/', include('recipe.urls')),
+    path('metrics', core_views.metrics, name='metrics'),
+]
+
+# Media on another host (a bucket or CDN) or in a storage without local
+# files is not served by the app
+if settings.MEDIA_URL.startswith('/') and \
+        issubclass(get_storage_class(), FileSystemStorage):
+    urlpatterns.append(re_path(
+        rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$',
+        core_views.serve_media,
+        name='media'
+    ))
@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+if settings.WSGI_PRELOAD:
+    from core.startup import preload
+
+    preload()
+
+if settings.PROFILE_SIGNAL:
+    from core.profiling import install_signal_handler
+
+    install_signal_handler()
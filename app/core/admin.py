@@ -1,8 +1,122 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from core import models
+from recipe import purge
+from user.tasks import schedule_delete
+
+
+# Query string parameter holding the last primary key of the previous page
+CURSOR_VAR = 'after'
+
+
+def estimated_count(queryset):
+    """Return the planner's row estimate for a queryset, None if unknown"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the PostgreSQL row estimate on large results
+
+    Rows are counted up to ADMIN_EXACT_COUNT_MAX, which stays cheap. Only
+    results larger than that are estimated, or counted in full on
+    databases without an estimate.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_MAX
+        count = self.object_list[:limit + 1].count()
+        if count <= limit:
+            return count
+
+        estimate = estimated_count(self.object_list)
+        if estimate is None:
+            return super().count
+        self.estimated = True
+
+        return max(estimate, count)
+
+
+class KeysetChangeList(ChangeList):
+    """Changelist paging by primary key instead of by offset
+
+    Every page is read with `pk < cursor`, newest first, so deep pages cost
+    as much as the first one. The total shown comes from the paginator,
+    estimated on large tables.
+    """
+    keyset = True
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_results(self, request):
+        self.cursor = self.params.get(CURSOR_VAR)
+        queryset = self.queryset
+        if self.cursor:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.cursor))
+            except ValueError:
+                raise IncorrectLookupParameters
+        rows = list(queryset[:self.list_per_page + 1])
+
+        self.result_list = rows[:self.list_per_page]
+        self.next_cursor = self.result_list[-1].pk \
+            if len(rows) > self.list_per_page else None
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin for tables too large for counts, offsets and select boxes"""
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+    sortable_by = ()
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 
 class UserAdmin(BaseUserAdmin):
@@ -23,8 +137,50 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """List the users only, their data is not collected on the page"""
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            []
+        )
+
+    def delete_model(self, request, obj):
+        """Deactivate the user, their data is deleted in the background"""
+        schedule_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            schedule_delete(user)
+
+
+class RecipeAttrAdmin(LargeTableAdmin):
+    list_display = ['name', 'user']
+    # Prefix searches are served by the UPPER(name) pattern indexes
+    search_fields = ['name__istartswith']
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    search_fields = ['title__istartswith', 'user__email__exact']
+    autocomplete_fields = ['tags', 'ingredients']
+
+    def delete_model(self, request, obj):
+        """Hide the recipe now, the purge job deletes it with its images"""
+        obj.soft_delete()
+        purge.schedule(obj.user)
+
+    def delete_queryset(self, request, queryset):
+        users = set()
+        for recipe in queryset.select_related('user'):
+            recipe.soft_delete()
+            users.add(recipe.user)
+        for user in users:
+            purge.schedule(user)
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
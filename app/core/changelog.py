@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.models import BigIntegerField, Func
+from django.db.models.signals import post_save, post_delete, pre_delete, \
+    m2m_changed
+
+from core.models import Tag, Ingredient, Recipe, Change
+
+
+KINDS = {
+    Tag: Change.KIND_TAG,
+    Ingredient: Change.KIND_INGREDIENT,
+    Recipe: Change.KIND_RECIPE,
+}
+
+# Users being deleted, whose cascaded deletes must not be logged
+_deleting_users = ContextVar('deleting_users', default=frozenset())
+
+
+class TransactionId(Func):
+    """Id of the writing transaction on PostgreSQL, NULL elsewhere"""
+    arity = 0
+    output_field = BigIntegerField()
+
+    def as_sql(self, compiler, connection):
+        return 'NULL', []
+
+    def as_postgresql(self, compiler, connection):
+        return 'txid_current()', []
+
+
+def running_transactions(using):
+    """Return the oldest transaction still running and the current one
+
+    Changes written by that transaction or a later one may have committed
+    before changes with a lower id that are not visible yet. Both are
+    None where transaction ids are not recorded.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None, None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT txid_snapshot_xmin(txid_current_snapshot()), '
+            'txid_current_if_assigned()'
+        )
+        return cursor.fetchone()
+
+
+def is_deleting(user_id):
+    """Tell whether the objects of a user are being deleted with them"""
+    return user_id in _deleting_users.get()
+
+
+@contextmanager
+def deleting(*user_ids):
+    """Treat the objects of users as being deleted with them"""
+    token = _deleting_users.set(_deleting_users.get() | set(user_ids))
+    try:
+        yield
+    finally:
+        _deleting_users.reset(token)
+
+
+def record(user_id, kind, object_ids, op, using=None):
+    """Log changed objects of a user, replacing their earlier entries"""
+    object_ids = list(object_ids)
+    if not object_ids or is_deleting(user_id):
+        return
+    changes = Change.objects.using(using) if using else Change.objects
+    changes.filter(
+        user_id=user_id,
+        kind=kind,
+        object_id__in=object_ids
+    ).delete()
+    changes.bulk_create([
+        Change(user_id=user_id, kind=kind, object_id=object_id, op=op,
+               txid=TransactionId())
+        for object_id in object_ids
+    ])
+
+
+def is_soft_deleted(instance):
+    return getattr(instance, 'deleted_at', None) is not None
+
+
+def record_saved(sender, instance, using, **kwargs):
+    op = Change.OP_DELETE if is_soft_deleted(instance) else Change.OP_UPSERT
+    record(instance.user_id, KINDS[sender], [instance.pk], op, using)
+
+
+def record_deleted(sender, instance, using, **kwargs):
+    # Soft deleted recipes were logged as deleted already
+    if not is_soft_deleted(instance):
+        record(instance.user_id, KINDS[sender], [instance.pk],
+               Change.OP_DELETE, using)
+
+
+def record_detached_recipes(sender, instance, using, **kwargs):
+    """Log recipes losing a tag or ingredient that is being deleted"""
+    recipe_ids = Recipe.objects.using(using) \
+        .filter(**{f'{KINDS[sender]}s': instance}) \
+        .values_list('id', flat=True)
+    record(instance.user_id, Change.KIND_RECIPE, recipe_ids,
+           Change.OP_UPSERT, using)
+
+
+def record_relinked(sender, instance, action, reverse, pk_set, using,
+                    **kwargs):
+    """Log recipes whose tags or ingredients changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif pk_set:
+        recipe_ids = pk_set
+    else:
+        return
+    record(instance.user_id, Change.KIND_RECIPE, recipe_ids,
+           Change.OP_UPSERT, using)
+
+
+def connect():
+    """Keep the change log up to date with user owned objects"""
+    for model in KINDS:
+        post_save.connect(record_saved, sender=model)
+        post_delete.connect(record_deleted, sender=model)
+    for model in (Tag, Ingredient):
+        pre_delete.connect(record_detached_recipes, sender=model)
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(record_relinked, sender=through)
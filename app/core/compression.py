@@ -0,0 +1,188 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from core.startup import lazy_import
+
+
+# Optional, loaded on the first response compressed with them
+brotli = lazy_import('brotli')
+zstandard = lazy_import('zstandard')
+
+
+# Types worth compressing, anything else (images, archives) already is
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def available_codecs():
+    """Return the codecs that can be used here, by content coding name"""
+    codecs = {'gzip': GzipCompressor}
+    if brotli is not None:
+        codecs['br'] = BrotliCompressor
+    if zstandard is not None:
+        codecs['zstd'] = ZstdCompressor
+
+    return codecs
+
+
+def compress(encoding, data, level=None):
+    """Compress a whole body with one codec"""
+    compressor = make_compressor(encoding, level)
+
+    return compressor.compress(data) + compressor.finish()
+
+
+def make_compressor(encoding, level=None):
+    if level is None:
+        level = settings.COMPRESSION_LEVELS[encoding]
+
+    return available_codecs()[encoding](level)
+
+
+def parse_accept_encoding(header):
+    """Return the codings a client accepts mapped to their q value"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    return accepted
+
+
+def negotiate(header):
+    """Pick the coding to answer with, None to send the body as is
+
+    The client's q values decide first, ties go to the order of
+    COMPRESSION_CODECS.
+    """
+    accepted = parse_accept_encoding(header)
+    codecs = available_codecs()
+    best, best_quality = None, 0.0
+    for coding in settings.COMPRESSION_CODECS:
+        if coding not in codecs:
+            continue
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+
+def is_compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].lower()
+
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Compress responses with the best coding the client accepts
+
+    Bodies smaller than COMPRESSION_MIN_SIZE, responses that already
+    carry a Content-Encoding, partial content and types that are
+    compressed already are sent as they are. Streaming responses are
+    compressed chunk by chunk, flushing after each one.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code == 206 or \
+                response.has_header('Content-Encoding') or \
+                not is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(
+                response.streaming_content, make_compressor(encoding)
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is not byte for byte the one tagged
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+
+        return response
+
+    def compress_stream(self, chunks, compressor):
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
@@ -0,0 +1,81 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.utils import OperationalError
+
+
+# Models always read from the primary: a token created by a login is
+# used right away by requests that the login did not pin
+PRIMARY_MODELS = {'authtoken.token'}
+
+# Replica alias the current request reads from, None for the primary
+_replica = ContextVar('replica', default=None)
+# Replica alias -> time after which an unreachable replica is retried
+_unhealthy = {}
+
+
+def is_reachable(alias):
+    """Connect to a replica and remember it as unhealthy on failure"""
+    if _unhealthy.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        _unhealthy[alias] = time.monotonic() + \
+            settings.DATABASE_REPLICA_RETRY_SECONDS
+        return False
+
+    _unhealthy.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Return a random reachable replica alias, or None for the primary"""
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if is_reachable(alias):
+            return alias
+
+    return None
+
+
+def use_replica(alias):
+    """Send reads of the current context to a replica, return reset token"""
+    return _replica.set(alias)
+
+
+def reset_replica(token):
+    _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request
+
+    Writes, reads inside a transaction, reads outside of a request scope
+    and reads of PRIMARY_MODELS always go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections['default'].in_atomic_block or \
+                model._meta.label_lower in PRIMARY_MODELS:
+            return None
+
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
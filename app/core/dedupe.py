@@ -0,0 +1,79 @@
+from itertools import groupby
+
+
+def _normalize(name):
+    return ' '.join(name.split())
+
+
+def _rename(objects, renames):
+    for pk, name in renames.items():
+        objects.filter(pk=pk).update(name=name)
+
+
+def merge_duplicates(model, through, column, change_model, kind,
+                     using='default'):
+    """Merge tags or ingredients of a user that share a normalized name
+
+    The oldest object of every group is kept. Recipes pointing at the
+    others are relinked to it in the through table and the others are
+    deleted, leaving tombstones in the change log. Names are rewritten in
+    normalized form. Models are passed in so that migrations can run this
+    with historical models. Returns the number of objects removed.
+    """
+    objects = model.objects.using(using)
+    links = through.objects.using(using)
+    changes = change_model.objects.using(using)
+    removed = 0
+    rows = objects.order_by('user_id', 'pk') \
+        .values_list('user_id', 'pk', 'name').iterator()
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        keep = {}
+        duplicates = {}
+        renames = {}
+        for _, pk, name in user_rows:
+            normalized = _normalize(name)
+            key = normalized.lower()
+            if key in keep:
+                duplicates[pk] = keep[key]
+            else:
+                keep[key] = pk
+                if normalized != name:
+                    renames[pk] = normalized
+        if not duplicates:
+            _rename(objects, renames)
+            continue
+
+        linked = set(
+            links.filter(**{f'{column}__in': set(duplicates.values())})
+            .values_list('recipe_id', column)
+        )
+        relinked = []
+        recipe_ids = set()
+        for recipe_id, duplicate in links.filter(
+                **{f'{column}__in': list(duplicates)}) \
+                .values_list('recipe_id', column):
+            recipe_ids.add(recipe_id)
+            target = (recipe_id, duplicates[duplicate])
+            if target not in linked:
+                linked.add(target)
+                relinked.append(through(
+                    recipe_id=recipe_id,
+                    **{column: target[1]}
+                ))
+        links.bulk_create(relinked, batch_size=1000)
+        links.filter(**{f'{column}__in': list(duplicates)}).delete()
+        objects.filter(pk__in=list(duplicates)).delete()
+        _rename(objects, renames)
+
+        for object_kind, ids, op in ((kind, list(duplicates), 'delete'),
+                                     ('recipe', list(recipe_ids), 'upsert')):
+            changes.filter(user_id=user_id, kind=object_kind,
+                           object_id__in=ids).delete()
+            changes.bulk_create([
+                change_model(user_id=user_id, kind=object_kind,
+                             object_id=object_id, op=op)
+                for object_id in ids
+            ])
+        removed += len(duplicates)
+
+    return removed
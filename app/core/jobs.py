@@ -0,0 +1,133 @@
+import json
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core import sharding
+from core.models import Job
+
+
+_registry = {}
+_discovered = False
+
+
+def task(name):
+    """Register a function as a background task under the given name"""
+    def decorator(func):
+        _registry[name] = func
+        func.task_name = name
+        return func
+
+    return decorator
+
+
+def autodiscover():
+    """Import the `tasks` module of every installed app"""
+    global _discovered
+    if not _discovered:
+        autodiscover_modules('tasks')
+        _discovered = True
+
+
+def get_task(name):
+    """Return the function registered for a task name"""
+    if name not in _registry:
+        autodiscover()
+
+    return _registry[name]
+
+
+def enqueue(task_name, user=None, max_attempts=3, delay=0, **payload):
+    """Add a job to the queue and return it"""
+    return Job.objects.create(
+        task=task_name,
+        payload=json.dumps(payload),
+        user=user,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    )
+
+
+def claim(worker_id, limit=1, visibility_timeout=None):
+    """Lock up to `limit` due jobs for a worker and return them
+
+    Jobs whose lock expired (the worker died or is stuck past the
+    visibility timeout) are handed out again.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = settings.JOB_VISIBILITY_TIMEOUT
+    now = timezone.now()
+    due = (
+        Q(status=Job.STATUS_QUEUED, run_after__lte=now) |
+        Q(status=Job.STATUS_RUNNING, locked_until__lt=now)
+    )
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('run_after', 'id')[:limit]
+        )
+        for job in jobs:
+            job.status = Job.STATUS_RUNNING
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = now + timedelta(seconds=visibility_timeout)
+        Job.objects.bulk_update(
+            jobs, ['status', 'attempts', 'locked_by', 'locked_until']
+        )
+
+    return jobs
+
+
+def run_job(job):
+    """Execute a claimed job and record the outcome
+
+    The outcome is only written while the job is still held by the same
+    claim, so a run that outlived its visibility timeout cannot overwrite
+    the result of the worker that picked the job up again.
+    """
+    changes = {'locked_until': None}
+    shard = sharding.use_shard(
+        sharding.shard_for_user(job.user) if job.user_id else None
+    )
+    try:
+        result = get_task(job.task)(**json.loads(job.payload))
+    except Exception:
+        changes['last_error'] = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            changes['status'] = Job.STATUS_FAILED
+            changes['finished_at'] = timezone.now()
+        else:
+            backoff = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            changes['status'] = Job.STATUS_QUEUED
+            changes['run_after'] = timezone.now() + timedelta(seconds=backoff)
+    else:
+        changes['status'] = Job.STATUS_SUCCEEDED
+        changes['result'] = json.dumps(result)
+        changes['finished_at'] = timezone.now()
+    finally:
+        sharding.reset_shard(shard)
+
+    Job.objects.filter(
+        pk=job.pk,
+        locked_by=job.locked_by,
+        attempts=job.attempts
+    ).update(**changes)
+    for field, value in changes.items():
+        setattr(job, field, value)
+
+    return job
+
+
+def run_pending(worker_id='inline', limit=100):
+    """Claim and run due jobs in the current thread, return them"""
+    jobs = claim(worker_id, limit=limit)
+    for job in jobs:
+        run_job(job)
+
+    return jobs
@@ -0,0 +1,25 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line
+
+    Structured data goes in the `fields` dict passed as `extra`, it is
+    merged into the object next to the time, level, logger and message.
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
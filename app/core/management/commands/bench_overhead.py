@@ -0,0 +1,115 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+# Run in a fresh interpreter per settings module, prints one JSON line
+MEASURE = '''
+import io, json, logging, os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+# Writing the 4xx warning of every request would dominate the timings
+logging.disable(logging.WARNING)
+path, count = sys.argv[2], int(sys.argv[3])
+
+def call():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost', 'HTTP_ACCEPT': 'application/json',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    body = application(environ, lambda status, _: statuses.append(status))
+    b''.join(body)
+    body.close()
+    return statuses[0]
+
+status = call()
+ready = time.perf_counter()
+for _ in range(count):
+    call()
+done = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'modules': len(sys.modules),
+    'startup': ready - started,
+    'request': (done - ready) / max(count, 1),
+}))
+'''
+
+
+class Command(BaseCommand):
+    """Django command to compare startup and request overhead of settings
+
+    Each settings module is loaded in fresh interpreters, which then
+    answer a request that needs no database (an unauthenticated API
+    call by default), so only the framework stack is measured.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-modules',
+                            default='app.settings,app.settings_api',
+                            help='Comma separated settings modules to compare')
+        parser.add_argument('--path', default='/api/recipe/recipes/',
+                            help='Path requested through the WSGI app')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per process after the first')
+        parser.add_argument('--starts', type=int, default=5,
+                            help='Fresh processes per settings module')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"settings":<28} {"status":<16} {"modules":>7} '
+            f'{"process ms":>10} {"startup ms":>10} {"request us":>10}'
+        )
+        for module in options['settings_modules'].split(','):
+            runs = [self.measure(module, options)
+                    for _ in range(options['starts'])]
+            median = {
+                key: statistics.median(run[key] for run in runs)
+                for key in ('modules', 'process', 'startup', 'request')
+            }
+            self.stdout.write(
+                f'{module:<28} {runs[0]["status"]:<16} '
+                f'{median["modules"]:>7.0f} '
+                f'{median["process"] * 1000:>10.1f} '
+                f'{median["startup"] * 1000:>10.1f} '
+                f'{median["request"] * 1e6:>10.1f}'
+            )
+
+        self.stdout.write(
+            'process is the wall time of the whole interpreter, startup '
+            'the time to a first answered request, request the mean time '
+            'of the requests after it.'
+        )
+
+    def measure(self, module, options):
+        """Time one fresh process serving requests with a settings module"""
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', MEASURE, module, options['path'],
+             str(options['requests'])],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(
+                f'Measuring {module} failed:\n{result.stderr.strip()}'
+            )
+
+        return dict(json.loads(result.stdout.splitlines()[-1]),
+                    process=elapsed)
@@ -0,0 +1,106 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from core import compression
+from core.management.commands.seed import TAG_NAMES, INGREDIENT_NAMES, \
+    TITLE_ADJECTIVES, TITLE_DISHES
+
+
+def recipe_payload(rng, count, detail):
+    """Return a JSON recipe list shaped like the API's responses"""
+    def attrs(names, low, high):
+        picked = rng.sample(range(len(names)), rng.randint(low, high))
+        if detail:
+            return [{'id': i + 1, 'name': names[i]} for i in picked]
+        return [i + 1 for i in picked]
+
+    recipes = [
+        {
+            'id': 1000 + number,
+            'title': f'{rng.choice(TITLE_ADJECTIVES)} '
+                     f'{rng.choice(TITLE_DISHES)}',
+            'ingredients': attrs(INGREDIENT_NAMES, 2, 12),
+            'tags': attrs(TAG_NAMES, 0, 4),
+            'time_minutes': rng.randint(5, 120),
+            'price': f'{rng.uniform(1, 40):.2f}',
+            'link': '',
+            'image': f'http://testserver/media/uploads/recipe/'
+                     f'{rng.getrandbits(128):032x}.jpg'
+            if rng.random() < 0.3 else None,
+        }
+        for number in range(count)
+    ]
+
+    return json.dumps(recipes).encode()
+
+
+class Command(BaseCommand):
+    """Django command to measure compression cost against bytes saved"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,20,100,1000',
+                            help='Comma separated recipe counts per payload')
+        parser.add_argument('--levels', default='',
+                            help='Levels to try per codec, e.g. '
+                                 'gzip:1,6,9;br:1,4,11 (default: settings)')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Runs per measurement, the median is shown')
+        parser.add_argument('--detail', action='store_true',
+                            help='Nest tag and ingredient names like the '
+                                 'detail serializer')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        codecs = compression.available_codecs()
+        levels = self.parse_levels(options['levels'], codecs)
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(
+            f'{"recipes":>8} {"codec":>6} {"level":>5} {"bytes":>9} '
+            f'{"out":>8} {"ratio":>6} {"ms":>8} {"MB/s":>8} {"KB/ms":>7}'
+        )
+        for count in [int(size) for size in options['sizes'].split(',')]:
+            body = recipe_payload(rng, count, options['detail'])
+            for encoding, level in levels:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    out = compression.compress(encoding, body, level)
+                    timings.append(time.perf_counter() - started)
+                seconds = statistics.median(timings)
+                saved_kb = (len(body) - len(out)) / 1024
+                self.stdout.write(
+                    f'{count:>8} {encoding:>6} {level:>5} {len(body):>9} '
+                    f'{len(out):>8} {len(body) / len(out):>6.1f} '
+                    f'{seconds * 1000:>8.3f} '
+                    f'{len(body) / seconds / 1e6:>8.1f} '
+                    f'{saved_kb / (seconds * 1000):>7.1f}'
+                )
+
+        self.stdout.write(
+            'ms is the CPU time to compress one response, KB/ms the '
+            'bandwidth saved per millisecond of it.'
+        )
+
+    def parse_levels(self, spec, codecs):
+        """Return (codec, level) pairs to measure"""
+        if not spec:
+            return [
+                (encoding, settings.COMPRESSION_LEVELS[encoding])
+                for encoding in settings.COMPRESSION_CODECS
+                if encoding in codecs
+            ]
+
+        pairs = []
+        for part in filter(None, spec.split(';')):
+            encoding, _, values = part.partition(':')
+            if encoding not in codecs:
+                raise CommandError(f'Codec {encoding} is not available')
+            pairs += [(encoding, int(level)) for level in values.split(',')]
+
+        return pairs
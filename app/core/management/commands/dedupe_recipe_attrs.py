@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.dedupe import merge_duplicates
+from core.models import Tag, Ingredient, Recipe, Change
+
+
+class Command(BaseCommand):
+    """Django command to merge tags and ingredients with the same name"""
+
+    def handle(self, *args, **options):
+        for alias in settings.DATABASE_SHARDS:
+            for model, field in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+                removed = merge_duplicates(
+                    model,
+                    getattr(Recipe, field).through,
+                    f'{model._meta.model_name}_id',
+                    Change,
+                    model._meta.model_name,
+                    using=alias
+                )
+                self.stdout.write(
+                    f'{alias}: merged {removed} duplicate '
+                    f'{model._meta.verbose_name_plural}'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Duplicates merged'))
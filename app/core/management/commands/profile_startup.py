@@ -0,0 +1,95 @@
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+# Loads what a worker loads before its first request
+STARTUP = '''
+import os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print((time.perf_counter() - started) * 1000)
+'''
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_import_times(output):
+    """Return (module, self us, cumulative us, depth) from -X importtime"""
+    rows = []
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own), int(cumulative),
+                         (len(indent) - 1) // 2))
+
+    return rows
+
+
+class Command(BaseCommand):
+    """Django command to break down where worker startup time goes
+
+    A fresh interpreter loads the WSGI application and URL configuration
+    under `python -X importtime`; the import times are summed per top
+    level package and the slowest imports are listed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module',
+            default=os.environ.get('DJANGO_SETTINGS_MODULE'),
+            help='Settings module to start with (default: the current one)'
+        )
+        parser.add_argument('--top', type=int, default=15,
+                            help='Number of packages and modules listed')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP,
+             options['settings_module']],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr.strip()}')
+
+        rows = parse_import_times(result.stderr)
+        total = float(result.stdout.split()[-1])
+        imports = sum(own for name, own, cumulative, depth in rows) / 1000
+        self.stdout.write(
+            f'Startup took {total:.1f} ms, {imports:.1f} ms of it importing '
+            f'{len(rows)} modules'
+        )
+
+        packages = Counter()
+        for name, own, cumulative, depth in rows:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(f'\n{"package":<40} {"ms":>8} {"share":>6}')
+        for name, own in packages.most_common(options['top']):
+            self.stdout.write(
+                f'{name:<40} {own / 1000:>8.1f} '
+                f'{own / 1000 / imports:>6.0%}'
+            )
+
+        self.stdout.write(
+            f'\n{"slowest imports, with what they import":<40} {"ms":>8}'
+        )
+        top_level = sorted(
+            (row for row in rows if row[3] == 0),
+            key=lambda row: -row[2]
+        )
+        for name, own, cumulative, depth in top_level[:options['top']]:
+            self.stdout.write(f'{name:<40} {cumulative / 1000:>8.1f}')
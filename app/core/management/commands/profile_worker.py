@@ -0,0 +1,67 @@
+import json
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from core.profiling import request_path
+
+
+class Command(BaseCommand):
+    """Django command to sample the stacks of a running worker process
+
+    The worker is sent PROFILE_SIGNAL and samples all its threads for
+    the given number of seconds, without a restart. The stacks are
+    written in the folded format flamegraph tools read.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('pid', type=int, help='Worker process id')
+        parser.add_argument('--seconds', type=float, default=10,
+                            help='How long to sample for')
+        parser.add_argument('--output',
+                            help='File to write to (default: stdout)')
+
+    def handle(self, *args, **options):
+        pid, seconds = options['pid'], options['seconds']
+        if not settings.PROFILE_SIGNAL:
+            raise CommandError('Set PROFILE_SIGNAL for workers to profile')
+        if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+            raise CommandError(
+                f'--seconds must be between 0 and '
+                f'{settings.PROFILE_MAX_SECONDS}'
+            )
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        output = os.path.join(settings.PROFILE_DIR,
+                              f'{pid}-{time.time():.0f}.folded')
+        with open(request_path(pid), 'w') as file:
+            json.dump({'seconds': seconds, 'output': output}, file)
+        try:
+            os.kill(pid, getattr(signal, settings.PROFILE_SIGNAL))
+            deadline = time.monotonic() + seconds + 10
+            while not os.path.exists(output):
+                if time.monotonic() > deadline:
+                    raise CommandError(
+                        f'Process {pid} sent no profile, is it a worker '
+                        f'handling {settings.PROFILE_SIGNAL}?'
+                    )
+                time.sleep(0.1)
+        except ProcessLookupError:
+            raise CommandError(f'No process {pid}')
+        finally:
+            os.remove(request_path(pid))
+
+        with open(output) as file:
+            report = file.read()
+        os.remove(output)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report, ending='')
+        samples = sum(int(line.rsplit(' ', 1)[1])
+                      for line in report.splitlines())
+        self.stderr.write(f'{samples} samples from process {pid}')
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from core import sharding
+
+
+class Command(BaseCommand):
+    """Django command to move users onto the shard the hash ring picks"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', dest='email',
+            help='Only move the user with this email'
+        )
+        parser.add_argument(
+            '--to', dest='target',
+            help='Move the user to this shard instead of the ring choice'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the moves that would be made'
+        )
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if target and not options['email']:
+            raise CommandError('--to can only be used together with --user')
+        if target and target not in settings.DATABASE_SHARDS:
+            raise CommandError(f'Unknown shard {target}')
+
+        users = get_user_model().objects.order_by('pk')
+        if options['email']:
+            users = users.filter(email=options['email'])
+            if not users.exists():
+                raise CommandError(f"No user {options['email']}")
+
+        ring = sharding.get_ring()
+        moved = 0
+        for user in users.iterator():
+            source = sharding.shard_for_user(user)
+            destination = target or ring.get(user.pk)
+            if source == destination:
+                continue
+            self.stdout.write(f'{user.email}: {source} -> {destination}')
+            if not options['dry_run']:
+                sharding.move_user(user, destination)
+            moved += 1
+
+        verb = 'to move' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'{moved} user(s) {verb}'))
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections, connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    """Django command to process queued background jobs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int,
+            default=settings.JOB_WORKER_PROCESSES,
+            help='Number of worker processes'
+        )
+        parser.add_argument(
+            '--threads', type=int,
+            default=settings.JOB_WORKER_THREADS,
+            help='Number of threads per worker process'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            default=settings.JOB_VISIBILITY_TIMEOUT,
+            help='Seconds a claimed job stays hidden from other workers'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        jobs.autodiscover()
+        processes = options['processes']
+        self.stdout.write(
+            f"Starting {processes} worker process(es) with "
+            f"{options['threads']} thread(s) each"
+        )
+        if processes <= 1:
+            self.work(options)
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+        # Forward shutdown so children finish their current jobs first
+        signal.signal(
+            signal.SIGTERM,
+            lambda *args: [child.terminate() for child in children]
+        )
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+
+    def work(self, options):
+        """Claim and run jobs until stopped"""
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        stop = threading.Event()
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread and not options['burst']:
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+        threads = options['threads']
+        if threads <= 1:
+            while not stop.is_set():
+                claimed = jobs.claim(
+                    worker_id,
+                    visibility_timeout=options['visibility_timeout']
+                )
+                for job in claimed:
+                    jobs.run_job(job)
+                    self.stdout.write(f'{job} finished')
+                if not claimed:
+                    if options['burst']:
+                        break
+                    stop.wait(options['poll_interval'])
+            return
+
+        slots = threading.Semaphore(threads)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while not stop.is_set():
+                free = 0
+                while slots.acquire(blocking=False):
+                    free += 1
+                claimed = jobs.claim(
+                    worker_id,
+                    limit=free,
+                    visibility_timeout=options['visibility_timeout']
+                ) if free else []
+                for _ in range(free - len(claimed)):
+                    slots.release()
+                for job in claimed:
+                    pool.submit(self.run, job, slots)
+
+                if not claimed:
+                    if options['burst'] and free == threads:
+                        break
+                    stop.wait(options['poll_interval'])
+
+    def run(self, job, slots):
+        """Run a single job on a pool thread"""
+        try:
+            close_old_connections()
+            jobs.run_job(job)
+            self.stdout.write(f'{job} finished')
+        finally:
+            connections.close_all()
+            slots.release()
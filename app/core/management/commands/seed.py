@@ -0,0 +1,271 @@
+import csv
+import io
+import multiprocessing
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core import sharding
+from core.models import Tag, Ingredient, Recipe, Change
+
+
+TAG_NAMES = (
+    'Breakfast', 'Lunch', 'Dinner', 'Dessert', 'Snack', 'Vegan',
+    'Vegetarian', 'Gluten free', 'Dairy free', 'Quick', 'Slow cooker',
+    'Baking', 'Grill', 'Comfort food', 'Healthy', 'Spicy', 'Italian',
+    'Mexican', 'Indian', 'Thai', 'Japanese', 'French', 'Greek',
+    'Middle Eastern', 'Holiday', 'Party', 'Kids', 'Budget', 'Meal prep',
+    'One pot', 'Soup', 'Salad', 'Seafood', 'Low carb', 'High protein',
+)
+INGREDIENT_NAMES = (
+    'Salt', 'Pepper', 'Olive oil', 'Butter', 'Garlic', 'Onion', 'Sugar',
+    'Flour', 'Eggs', 'Milk', 'Tomato', 'Lemon', 'Rice', 'Pasta', 'Chicken',
+    'Beef', 'Pork', 'Salmon', 'Shrimp', 'Tofu', 'Potato', 'Carrot',
+    'Celery', 'Bell pepper', 'Spinach', 'Kale', 'Mushroom', 'Zucchini',
+    'Broccoli', 'Cheddar', 'Parmesan', 'Mozzarella', 'Cream', 'Yogurt',
+    'Honey', 'Soy sauce', 'Ginger', 'Chili', 'Cumin', 'Paprika', 'Basil',
+    'Oregano', 'Thyme', 'Rosemary', 'Cinnamon', 'Vanilla', 'Chocolate',
+    'Oats', 'Bread', 'Beans', 'Chickpeas', 'Lentils', 'Coconut milk',
+    'Avocado', 'Lime', 'Cilantro', 'Parsley', 'Vinegar', 'Mustard',
+    'Almonds',
+)
+TITLE_ADJECTIVES = (
+    'Easy', 'Classic', 'Crispy', 'Creamy', 'Spicy', 'Roasted', 'Grilled',
+    'Smoky', 'Zesty', 'Hearty', 'Quick', 'Rustic', 'Sticky', 'Fresh',
+)
+TITLE_DISHES = (
+    'curry', 'stew', 'pasta', 'salad', 'soup', 'tacos', 'risotto',
+    'stir fry', 'bowl', 'pie', 'casserole', 'burger', 'pancakes',
+    'noodles', 'bread', 'cake', 'cookies', 'skewers', 'wraps', 'chili',
+)
+
+
+def power_law_counts(rng, total, size, alpha):
+    """Split `total` into `size` counts following a Pareto distribution"""
+    weights = [rng.paretovariate(alpha) for _ in range(size)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in sorted(range(size), key=lambda i: -weights[i]):
+        if sum(counts) >= total:
+            break
+        counts[index] += 1
+
+    return counts
+
+
+def pick(rng, objects, low, high):
+    """Pick a few distinct objects, favouring those early in the list"""
+    count = min(rng.randint(low, high), len(objects))
+    weights = [1 / (rank + 1) for rank in range(len(objects))]
+    picked = set()
+    while len(picked) < count:
+        picked.update(rng.choices(range(len(objects)), weights, k=count))
+
+    return [objects[index] for index in sorted(picked)[:count]]
+
+
+def names(rng, vocabulary, count):
+    """Return `count` distinct names, numbered once the vocabulary runs out"""
+    chosen = rng.sample(vocabulary, min(count, len(vocabulary)))
+    chosen += [
+        f'{rng.choice(vocabulary)} {number}'
+        for number in range(2, count - len(chosen) + 2)
+    ]
+
+    return chosen
+
+
+def insert(model, rows, using):
+    """Insert rows given as field dicts, with COPY on PostgreSQL"""
+    if not rows:
+        return
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        model.objects.using(using).bulk_create(
+            [model(**row) for row in rows]
+        )
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # COPY reads an unquoted empty field as NULL, quoted it is ''
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(
+        [row[column] for column in columns] for row in rows
+    )
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f'COPY {model._meta.db_table} ({", ".join(columns)}) '
+            f'FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+
+
+def read_ids(model, user_ids, using):
+    """Return the ids of objects of the given users in insertion order"""
+    ids = {user_id: [] for user_id in user_ids}
+    for pk, user_id in model.objects.using(using) \
+            .filter(user_id__in=user_ids) \
+            .order_by('id').values_list('id', 'user_id').iterator():
+        ids[user_id].append(pk)
+
+    return ids
+
+
+def seed_users(task):
+    """Generate the library of a chunk of users on their shard"""
+    users, seed = task
+    using = users[0]['shard'] or 'default'
+    user_ids = [user['id'] for user in users]
+    rngs = {user['id']: random.Random(f'{seed}:{user["number"]}')
+            for user in users}
+
+    with transaction.atomic(using=using):
+        for model, vocabulary, alpha in ((Tag, TAG_NAMES, 2.5),
+                                         (Ingredient, INGREDIENT_NAMES, 2)):
+            insert(model, [
+                {'user_id': user['id'], 'name': name}
+                for user in users
+                for name in names(
+                    rngs[user['id']],
+                    vocabulary,
+                    int(5 * rngs[user['id']].paretovariate(alpha))
+                )
+            ], using)
+        tag_ids = read_ids(Tag, user_ids, using)
+        ingredient_ids = read_ids(Ingredient, user_ids, using)
+
+        rows = []
+        for user in users:
+            rng = rngs[user['id']]
+            for _ in range(user['recipes']):
+                rows.append({
+                    'user_id': user['id'],
+                    'title': f'{rng.choice(TITLE_ADJECTIVES)} '
+                             f'{rng.choice(TITLE_DISHES)}',
+                    'time_minutes': min(int(rng.lognormvariate(3.3, 0.6)),
+                                        600) or 1,
+                    'price': round(min(rng.lognormvariate(2, 0.6), 999), 2),
+                    'link': '',
+                })
+        insert(Recipe, rows, using)
+        recipe_ids = read_ids(Recipe, user_ids, using)
+
+        links = {'tag': [], 'ingredient': []}
+        for user in users:
+            rng = rngs[user['id']]
+            for recipe_id in recipe_ids[user['id']]:
+                for tag_id in pick(rng, tag_ids[user['id']], 0, 4):
+                    links['tag'].append(
+                        {'recipe_id': recipe_id, 'tag_id': tag_id}
+                    )
+                for ingredient_id in pick(
+                        rng, ingredient_ids[user['id']], 2, 12):
+                    links['ingredient'].append({
+                        'recipe_id': recipe_id,
+                        'ingredient_id': ingredient_id,
+                    })
+        insert(Recipe.tags.through, links['tag'], using)
+        insert(Recipe.ingredients.through, links['ingredient'], using)
+
+        # Seeded objects show up in the first sync like any other
+        insert(Change, [
+            {'user_id': user_id, 'kind': kind, 'object_id': object_id,
+             'op': Change.OP_UPSERT}
+            for kind, ids in ((Change.KIND_TAG, tag_ids),
+                              (Change.KIND_INGREDIENT, ingredient_ids),
+                              (Change.KIND_RECIPE, recipe_ids))
+            for user_id in user_ids
+            for object_id in ids[user_id]
+        ], using)
+
+    return sum(user['recipes'] for user in users)
+
+
+class Command(BaseCommand):
+    """Django command to fill the database with generated recipe data"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Number of users to create')
+        parser.add_argument('--recipes', type=int, default=100000,
+                            help='Number of recipes to spread over users')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed, the same seed gives the '
+                                 'same data')
+        parser.add_argument('--processes', type=int,
+                            default=multiprocessing.cpu_count(),
+                            help='Number of processes inserting data')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Users generated per unit of work')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users = self.create_users(options)
+        rng = random.Random(options['seed'])
+        counts = power_law_counts(rng, options['recipes'], len(users), 1.2)
+        for user, count in zip(users, counts):
+            user['recipes'] = count
+
+        # Every unit of work stays on one shard
+        size = options['chunk_size']
+        tasks = []
+        for shard in sorted({user['shard'] for user in users}):
+            on_shard = [user for user in users if user['shard'] == shard]
+            tasks += [
+                (on_shard[start:start + size], options['seed'])
+                for start in range(0, len(on_shard), size)
+            ]
+
+        if options['processes'] <= 1:
+            done = sum(map(seed_users, tasks))
+        else:
+            # Children must not share the parent's database connections
+            connections.close_all()
+            with multiprocessing.Pool(options['processes']) as pool:
+                done = sum(pool.imap_unordered(seed_users, tasks))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users and {done} recipes in '
+            f'{time.monotonic() - started:.1f}s'
+        ))
+
+    def create_users(self, options):
+        """Insert the seed users, return their ids and shards"""
+        model = get_user_model()
+        prefix = f'seed{options["seed"]}-'
+        if model.objects.filter(email__startswith=prefix).exists():
+            raise CommandError(
+                f'Users for seed {options["seed"]} exist, use another --seed'
+            )
+
+        # Hash once, all seed users share the password "password"
+        password = make_password('password')
+        insert(model, [
+            {'email': f'{prefix}{number}@example.com',
+             'name': f'Seed user {number}', 'password': password,
+             'is_active': True, 'is_staff': False, 'is_superuser': False,
+             'shard': ''}
+            for number in range(options['users'])
+        ], 'default')
+        users = list(
+            model.objects.filter(email__startswith=prefix).order_by('id')
+        )
+        if sharding.is_sharded():
+            ring = sharding.get_ring()
+            for user in users:
+                user.shard = ring.get(user.pk)
+            model.objects.bulk_update(users, ['shard'], batch_size=1000)
+            for shard in {user.shard for user in users} - {'default'}:
+                model.objects.using(shard).bulk_create(
+                    [user for user in users if user.shard == shard]
+                )
+
+        return [
+            {'id': user.pk, 'number': number, 'shard': user.shard}
+            for number, user in enumerate(users)
+        ]
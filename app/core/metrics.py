@@ -0,0 +1,86 @@
+import bisect
+import threading
+from collections import defaultdict
+
+
+# Upper bounds in seconds of the request duration buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram per set of label values, in this process
+
+    Each worker process keeps its own counts; Prometheus sums them when
+    it scrapes every worker, or a collector in front adds them up.
+    """
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = defaultdict(
+            lambda: [[0] * (len(self.buckets) + 1), 0.0]
+        )
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series[key]
+            counts[index] += 1
+            self.series[key][1] = total + value
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        """Return the series in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {self.name} {self.help_text}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            series = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self.series.items()
+            )
+        for key, counts, total in series:
+            labels = ','.join(
+                f'{label}="{escape(value)}"'
+                for label, value in zip(self.labels, key)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time spent answering HTTP requests, by route',
+    ('route', 'method', 'status'),
+    DURATION_BUCKETS
+)
+
+REGISTRY = [REQUEST_DURATION]
+
+
+def render():
+    """Return all metrics of this process as Prometheus text"""
+    return ''.join(metric.render() for metric in REGISTRY)
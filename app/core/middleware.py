@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import dbrouters, metrics
+from core.profiling import StackSampler, format_folded
+
+
+access_log = logging.getLogger('app.access')
+slow_log = logging.getLogger('app.slow_requests')
+
+sampler = StackSampler(settings.SLOW_REQUEST_SAMPLE_INTERVAL)
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_pin_key(request):
+    """Return the cache key identifying the client for read-your-writes
+
+    Clients are told apart by their Authorization header. Only clients
+    without one, such as a login, fall back to their address, so
+    clients sharing an address do not pin each other.
+    """
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        digest = hashlib.sha1(authorization.encode()).hexdigest()
+        return f'replica-pin:auth:{digest}'
+
+    return f"replica-pin:ip:{request.META.get('REMOTE_ADDR')}"
+
+
+class ReplicaRoutingMiddleware:
+    """Serve safe requests from a read replica
+
+    After a client writes, its reads stay on the primary for
+    DATABASE_REPLICA_PIN_SECONDS so that it always sees its own changes.
+    The pins are kept in the default cache, which must be shared by all
+    workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        key = replica_pin_key(request)
+        alias = None
+        if request.method in SAFE_METHODS and not cache.get(key):
+            alias = dbrouters.choose_replica()
+
+        token = dbrouters.use_replica(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            dbrouters.reset_replica(token)
+
+        if request.method not in SAFE_METHODS:
+            cache.set(key, True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+        return response
+
+
+class QueryRecorder:
+    """Database execute wrapper counting and timing the queries made
+
+    The SQL, without its parameters, of the first `limit` queries is
+    kept for slow request reports.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.seconds += duration
+            if len(self.queries) < self.limit:
+                self.queries.append((duration, sql))
+
+
+def request_user(request):
+    """Return the authenticated user without looking it up, or None"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    if user is None or not user.is_authenticated:
+        return None
+
+    return user
+
+
+class AccessLogMiddleware:
+    """Log each request as structured data and time it per route
+
+    Requests slower than SLOW_REQUEST_SECONDS are logged again with
+    their slowest queries and the stacks their thread was sampled in.
+    Sampling only starts once a request has run for half the threshold,
+    so requests finishing before that are never sampled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_REQUEST_SECONDS
+        recorder = QueryRecorder(settings.SLOW_REQUEST_MAX_QUERIES)
+        thread_id = threading.get_ident()
+        samples = sampler.watch(thread_id, threshold / 2) \
+            if threshold else None
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            if samples is not None:
+                sampler.unwatch(thread_id)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.route if match else 'unmatched'
+        metrics.REQUEST_DURATION.observe(
+            duration, route=route, method=request.method,
+            status=response.status_code
+        )
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'bytes': None if response.streaming else len(response.content),
+            'queries': recorder.count,
+            'db_ms': round(recorder.seconds * 1000, 2),
+            'user_id': getattr(request_user(request), 'pk', None),
+        }
+        access_log.info('%s %s %s', request.method, request.path,
+                        response.status_code, extra={'fields': fields})
+
+        if threshold and duration >= threshold:
+            slowest = sorted(recorder.queries, key=lambda query: -query[0])
+            fields['sql'] = [
+                {'ms': round(seconds * 1000, 2), 'sql': sql}
+                for seconds, sql in slowest[:settings.SLOW_REQUEST_TOP_QUERIES]
+            ]
+            fields['stacks'] = [
+                f'{stack} {count}' for stack, count in
+                samples.most_common(settings.SLOW_REQUEST_TOP_STACKS)
+            ]
+            slow_log.warning('Slow request %s %s took %.0f ms',
+                             request.method, request.path, duration * 1000,
+                             extra={'fields': fields})
+
+        return response
+
+
+def staff_user(request):
+    """Return the staff user making a request, or None
+
+    Runs before the views authenticate API clients, so the token is
+    checked here.
+    """
+    user = request_user(request)
+    if user is None:
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = authenticated[0] if authenticated else None
+    if user is None or not user.is_staff:
+        return None
+
+    return user
+
+
+# Held by the one request of the process being profiled
+_profiling = threading.Lock()
+
+
+class ProfileMiddleware:
+    """Answer a request with its profile when a staff user asks for it
+
+    With REQUEST_PROFILING on, a request by staff carrying an
+    `X-Profile: 1` header or a `profile=1` query parameter has its thread
+    sampled every PROFILE_SAMPLE_INTERVAL and gets the samples as folded
+    stacks instead of the response. Anybody else gets the response, as
+    does staff while another request of the process is profiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_PROFILING or not (
+                request.META.get('HTTP_X_PROFILE') == '1' or
+                request.GET.get('profile') == '1'):
+            return self.get_response(request)
+        if staff_user(request) is None or \
+                not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+            samples = profiler.watch(threading.get_ident())
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        finally:
+            _profiling.release()
+
+        report = HttpResponse(format_folded(samples),
+                              content_type='text/plain; charset=utf-8')
+        report['X-Profile-Status'] = str(response.status_code)
+        report['X-Profile-Samples'] = str(sum(samples.values()))
+
+        return report
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard',
+            field=models.CharField(blank=True, max_length=63),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-19 09:01
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_changes(apps, schema_editor):
+    """Log existing objects so the first sync returns the whole library"""
+    Change = apps.get_model('core', 'Change')
+    db = schema_editor.connection.alias
+    for kind, model_name in (('tag', 'Tag'), ('ingredient', 'Ingredient'),
+                             ('recipe', 'Recipe')):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.using(db).order_by('id') \
+            .values_list('id', 'user_id').iterator()
+        while True:
+            batch = [
+                Change(user_id=user_id, kind=kind, object_id=object_id,
+                       op='upsert')
+                for object_id, user_id in islice(rows, 1000)
+            ]
+            if not batch:
+                break
+            Change.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('tag', 'Tag'), ('ingredient', 'Ingredient'), ('recipe', 'Recipe')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('op', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=6)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'id'], name='core_change_user_id_dfd788_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'kind', 'object_id'], name='core_change_user_id_72ab0d_idx'),
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+from core.dedupe import merge_duplicates
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge existing duplicates so the unique indexes can be built"""
+    Recipe = apps.get_model('core', 'Recipe')
+    Change = apps.get_model('core', 'Change')
+    db = schema_editor.connection.alias
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        through = Recipe._meta.get_field(field).remote_field.through
+        merge_duplicates(
+            apps.get_model('core', model_name),
+            through,
+            f'{model_name.lower()}_id',
+            Change,
+            model_name.lower(),
+            using=db
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_change'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, lower(name))',
+            'DROP INDEX core_tag_user_lower_name_uniq'
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_lower_name_uniq '
+            'ON core_ingredient (user_id, lower(name))',
+            'DROP INDEX core_ingredient_user_lower_name_uniq'
+        ),
+    ]
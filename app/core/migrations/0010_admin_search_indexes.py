@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# Expression indexes serving the admin's case-insensitive prefix searches
+SEARCH_INDEXES = (
+    ('core_tag_name_upper_like', 'core_tag', 'name'),
+    ('core_ingredient_name_upper_like', 'core_ingredient', 'name'),
+    ('core_recipe_title_upper_like', 'core_recipe', 'title'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} '
+            f'ON {table} (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_recipe_attr_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-19 09:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('data', models.TextField(default='{}')),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stale_since', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'recipe stats',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-19 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'time_minutes', 'id'], name='core_recipe_user_id_93b1a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price', 'id'], name='core_recipe_user_id_4dae59_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='core_recipe_user_id_93b1a9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='core_recipe_user_id_4dae59_idx',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'id'], name='core_recipe_live_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'time_minutes', 'id'], name='core_recipe_live_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'price', 'id'], name='core_recipe_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['user', 'id'], name='core_recipe_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+    ]
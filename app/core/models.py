@@ -1,11 +1,16 @@
 import uuid
 import os
 
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 from django.conf import settings
 
+from core import sharding
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
@@ -15,7 +20,17 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Delete the users without logging the objects cascaded along"""
+        from core import changelog
+
+        with changelog.deleting(*self.values_list('pk', flat=True)):
+            return super().delete()
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
 
     def create_user(self, email, password=None, **extra_fields):
         """Create and save a new user"""
@@ -24,6 +39,7 @@ class UserManager(BaseUserManager):
         user = self.model(email=self.normalize_email(email), **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
+        sharding.assign_shard(user)
 
         return user
 
@@ -43,34 +59,116 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=80)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Database alias holding the user's recipe data, blank for default
+    shard = models.CharField(max_length=63, blank=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
+    def delete(self, *args, **kwargs):
+        """Delete the user without logging the objects cascaded along"""
+        from core import changelog
 
-class Tag(models.Model):
-    """Tag to be used for a recipe"""
+        with changelog.deleting(self.pk):
+            return super().delete(*args, **kwargs)
+
+
+def normalize_name(name):
+    """Collapse runs of whitespace in a tag or ingredient name"""
+    return ' '.join(name.split())
+
+
+class RecipeAttrManager(models.Manager):
+
+    def get_or_create_many(self, user, names):
+        """Return objects of a user for the given names, creating missing
+
+        Runs one INSERT ... ON CONFLICT DO NOTHING against the unique
+        (user, lower(name)) index, then reads back the ids of all names.
+        """
+        from core import changelog
+
+        wanted = {}
+        for name in map(normalize_name, names):
+            wanted.setdefault(name.lower(), name)
+        self.bulk_create(
+            [self.model(user=user, name=name) for name in wanted.values()],
+            ignore_conflicts=True
+        )
+        found = {
+            obj.name.lower(): obj
+            for obj in self.annotate(key=Lower('name'))
+            .filter(user=user, key__in=list(wanted))
+        }
+        changelog.record(
+            user.pk,
+            changelog.KINDS[self.model],
+            [obj.pk for obj in found.values()],
+            Change.OP_UPSERT,
+            self.db
+        )
+
+        return [found[key] for key in wanted if key in found]
+
+
+class RecipeAttr(models.Model):
+    """Object a user attaches to recipes by name, unique per user"""
     name = models.CharField(max_length=50)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
 
+    objects = RecipeAttrManager()
+
+    class Meta:
+        abstract = True
+
+    def validate_unique(self, exclude=None):
+        """Check the (user, lower(name)) index as forms cannot see it"""
+        super().validate_unique(exclude)
+        if exclude and ('name' in exclude or 'user' in exclude):
+            return
+        clashes = type(self)._default_manager.annotate(key=Lower('name')) \
+            .filter(user_id=self.user_id,
+                    key=normalize_name(self.name).lower())
+        if self.pk is not None:
+            clashes = clashes.exclude(pk=self.pk)
+        if clashes.exists():
+            raise ValidationError({
+                'name': self.unique_error_message(type(self),
+                                                  ('user', 'name'))
+            })
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Tag(RecipeAttr):
+    """Tag to be used for a recipe"""
+
+
+class Ingredient(RecipeAttr):
     """Ingredients to be used in a recipe"""
-    name = models.CharField(max_length=50)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
 
-    def __str__(self):
-        return self.name
+
+class LiveRecipeManager(models.Manager):
+    """Recipes that have not been deleted"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Recipe(models.Model):
-    """Recipe object"""
+    """Recipe object
+
+    Deleting a recipe through the API only sets `deleted_at`, the purge
+    job removes the row, its links and its image files later. `objects`
+    only returns live recipes, `all_objects` deleted ones as well.
+    """
     title = models.CharField(max_length=80)
     time_minutes = models.SmallIntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
@@ -80,6 +178,128 @@ class Recipe(models.Model):
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveRecipeManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # Live recipes only, deleted ones wait for the purge job
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         condition=models.Q(deleted_at__isnull=True),
+                         name='core_recipe_live_id_idx'),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         condition=models.Q(deleted_at__isnull=True),
+                         name='core_recipe_live_time_idx'),
+            models.Index(fields=['user', 'price', 'id'],
+                         condition=models.Q(deleted_at__isnull=True),
+                         name='core_recipe_live_price_idx'),
+            models.Index(fields=['user', 'id'],
+                         condition=models.Q(deleted_at__isnull=False),
+                         name='core_recipe_deleted_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def soft_delete(self):
+        """Hide the recipe until the purge job deletes it"""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+
+class Job(models.Model):
+    """Unit of background work executed by the `run_workers` command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    result = models.TextField(blank=True)
+    last_error = models.TextField(blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True,
+                             on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+
+class Change(models.Model):
+    """Latest change to a user owned object, read by the sync API
+
+    Only the newest entry per object is kept, so a client catching up
+    reads one entry per changed object. Deleted objects keep a tombstone.
+    """
+    KIND_TAG = 'tag'
+    KIND_INGREDIENT = 'ingredient'
+    KIND_RECIPE = 'recipe'
+    KIND_CHOICES = (
+        (KIND_TAG, 'Tag'),
+        (KIND_INGREDIENT, 'Ingredient'),
+        (KIND_RECIPE, 'Recipe'),
+    )
+    OP_UPSERT = 'upsert'
+    OP_DELETE = 'delete'
+    OP_CHOICES = (
+        (OP_UPSERT, 'Created or updated'),
+        (OP_DELETE, 'Deleted'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    # Writing transaction, tells the sync API which entries may still be
+    # preceded by uncommitted ones
+    txid = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['user', 'kind', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f'{self.op} {self.kind} {self.object_id}'
+
+
+class RecipeStats(models.Model):
+    """Summary of a user's recipes served to dashboards
+
+    Refreshed in the background after the recipes change, `stale_since`
+    tells when the summary stopped matching them.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                on_delete=models.CASCADE, primary_key=True)
+    data = models.TextField(default='{}')
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    stale_since = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'recipe stats'
+
+    def __str__(self):
+        return f'Recipe stats of user {self.user_id}'
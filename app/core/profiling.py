@@ -0,0 +1,152 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+def folded_stack(frame):
+    """Return a stack as `module.function` names joined root first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}.{code.co_name}')
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+def format_folded(samples):
+    """Return samples in the folded format read by flamegraph tools"""
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in samples.most_common()
+    )
+
+
+class StackSampler:
+    """Count the stacks of watched threads from a background thread
+
+    Threads are only sampled once they have been watched for longer
+    than the delay they were registered with, so short requests cost a
+    dictionary insert and delete and nothing else.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def watch(self, thread_id, delay=0.0):
+        """Start sampling a thread after `delay` seconds, return counts"""
+        samples = Counter()
+        with self.lock:
+            self.watched[thread_id] = (time.monotonic() + delay, samples)
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='stack-sampler', daemon=True
+                )
+                self.thread.start()
+
+        return samples
+
+    def unwatch(self, thread_id):
+        with self.lock:
+            self.watched.pop(thread_id, None)
+
+    def sample(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [
+                (thread_id, samples)
+                for thread_id, (after, samples) in self.watched.items()
+                if after <= now
+            ]
+        if not due:
+            return
+        frames = sys._current_frames()
+        for thread_id, samples in due:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                samples[folded_stack(frame)] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def sample_threads(seconds, interval):
+    """Count the stacks of every other thread of the process for a while"""
+    samples = Counter()
+    own = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                samples[folded_stack(frame)] += 1
+        time.sleep(interval)
+
+    return samples
+
+
+def request_path(pid):
+    return os.path.join(settings.PROFILE_DIR, f'{pid}.json')
+
+
+_session = threading.Lock()
+
+
+def _profile_process(seconds, output):
+    try:
+        samples = sample_threads(seconds, settings.PROFILE_SAMPLE_INTERVAL)
+        partial = f'{output}.part'
+        with open(partial, 'w') as file:
+            file.write(format_folded(samples))
+        os.replace(partial, output)
+    finally:
+        _session.release()
+
+
+def _handle_signal(signum, frame):
+    """Start the profiling session the `profile_worker` command asked for
+
+    The request is read from PROFILE_DIR, sampling runs in a thread of
+    its own so the handler returns right away. A request arriving while
+    a session runs is ignored.
+    """
+    try:
+        with open(request_path(os.getpid())) as file:
+            request = json.load(file)
+    except (OSError, ValueError):
+        return
+    if not _session.acquire(blocking=False):
+        return
+
+    seconds = min(float(request['seconds']), settings.PROFILE_MAX_SECONDS)
+    threading.Thread(
+        target=_profile_process, args=(seconds, request['output']),
+        name='process-profiler', daemon=True
+    ).start()
+
+
+def install_signal_handler():
+    """Let `manage.py profile_worker` profile this process on a signal
+
+    Handlers can only be set from the main thread. Servers that load the
+    app in another one, such as the autoreloader of runserver, are left
+    alone and tell so by the False returned.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(getattr(signal, settings.PROFILE_SIGNAL), _handle_signal)
+
+    return True
@@ -0,0 +1,234 @@
+import bisect
+import hashlib
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, transaction
+
+
+# Models whose rows live on the shard of the user owning them
+SHARDED_MODELS = {
+    'core.tag',
+    'core.ingredient',
+    'core.recipe',
+    'core.recipe_tags',
+    'core.recipe_ingredients',
+    'core.change',
+    'core.recipestats',
+}
+
+# Shard the current request works on, None when not scoped to a user
+_shard = ContextVar('shard', default=None)
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to nodes
+
+    Every node is placed on the ring many times, so adding or removing a
+    node only moves about 1/N of the keys.
+    """
+
+    def __init__(self, nodes, points_per_node=128):
+        self._ring = sorted(
+            (self._hash(f'{node}:{point}'), node)
+            for node in nodes
+            for point in range(points_per_node)
+        )
+        self._hashes = [point for point, node in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(str(value).encode()).hexdigest()[:16], 16)
+
+    def get(self, key):
+        """Return the node owning a key"""
+        index = bisect.bisect(self._hashes, self._hash(key))
+        return self._ring[index % len(self._ring)][1]
+
+
+@lru_cache(maxsize=None)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def get_ring():
+    return _ring(tuple(settings.DATABASE_SHARDS))
+
+
+def is_sharded():
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def shard_for_user(user):
+    """Return the database alias holding the recipe data of a user"""
+    return user.shard or 'default'
+
+
+def use_shard(alias):
+    """Scope queries of the current context to a shard, return reset token"""
+    return _shard.set(alias)
+
+
+def reset_shard(token):
+    _shard.reset(token)
+
+
+def copy_user_to_shard(user, alias):
+    """Make sure a copy of the user row exists for foreign keys on a shard"""
+    if alias == 'default':
+        return
+    model = type(user)
+    copies = model.objects.using(alias).filter(pk=user.pk)
+    if not copies.update(shard=user.shard):
+        row = model(**{
+            field.attname: getattr(user, field.attname)
+            for field in model._meta.concrete_fields
+        })
+        model.objects.using(alias).bulk_create([row])
+
+
+def assign_shard(user):
+    """Place a new user on the shard picked by the hash ring"""
+    if not is_sharded():
+        return
+    user.shard = get_ring().get(user.pk)
+    type(user).objects.filter(pk=user.pk).update(shard=user.shard)
+    copy_user_to_shard(user, user.shard)
+
+
+def _copy_rows(queryset, target):
+    """Insert copies of rows on another database, return old to new ids"""
+    objs = list(queryset.order_by('pk'))
+    old_ids = [obj.pk for obj in objs]
+    for obj in objs:
+        obj.pk = None
+        obj._state.db = target
+    if connections[target].features.can_return_ids_from_bulk_insert:
+        queryset.model.objects.using(target).bulk_create(
+            objs, batch_size=1000
+        )
+    else:
+        for obj in objs:
+            obj.save(using=target, force_insert=True)
+
+    return dict(zip(old_ids, (obj.pk for obj in objs)))
+
+
+def move_user(user, target):
+    """Move all recipe data of a user to another shard
+
+    Rows get new ids on the target shard. Writes the user makes while the
+    move runs are lost, so run it while the user is inactive.
+    """
+    from core import changelog
+    from core.models import Tag, Ingredient, Recipe, Change, RecipeStats
+
+    source = shard_for_user(user)
+    if source == target:
+        return
+    user.shard = target
+    copy_user_to_shard(user, target)
+    with transaction.atomic(using=target):
+        ids = {
+            'tag': _copy_rows(
+                Tag.objects.using(source).filter(user=user), target
+            ),
+            'ingredient': _copy_rows(
+                Ingredient.objects.using(source).filter(user=user), target
+            ),
+        }
+        # Deleted recipes move too, the purge job removes their images
+        recipes = Recipe.all_objects.using(source).filter(user=user)
+        recipe_ids = _copy_rows(recipes, target)
+        live_ids = {
+            recipe_ids[recipe_id] for recipe_id in
+            recipes.filter(deleted_at__isnull=True)
+            .values_list('id', flat=True)
+        }
+        for related in ('tag', 'ingredient'):
+            through = Recipe._meta.get_field(f'{related}s') \
+                .remote_field.through
+            rows = through.objects.using(source) \
+                .filter(recipe__user=user) \
+                .values_list('recipe_id', f'{related}_id')
+            through.objects.using(target).bulk_create(
+                [
+                    through(**{
+                        'recipe_id': recipe_ids[recipe_id],
+                        f'{related}_id': ids[related][related_id],
+                    })
+                    for recipe_id, related_id in rows
+                ],
+                batch_size=1000
+            )
+        # Clients notice the new shard from their sync token and start over
+        for kind, new_ids in ((Change.KIND_TAG, ids['tag'].values()),
+                              (Change.KIND_INGREDIENT,
+                               ids['ingredient'].values()),
+                              (Change.KIND_RECIPE, live_ids)):
+            changelog.record(user.pk, kind, new_ids,
+                             Change.OP_UPSERT, using=target)
+
+    for alias in {'default', source}:
+        type(user).objects.using(alias).filter(pk=user.pk) \
+            .update(shard=target)
+    with transaction.atomic(using=source):
+        Recipe.all_objects.using(source).filter(user=user).delete()
+        Tag.objects.using(source).filter(user=user).delete()
+        Ingredient.objects.using(source).filter(user=user).delete()
+        Change.objects.using(source).filter(user=user).delete()
+        RecipeStats.objects.using(source).filter(user=user).delete()
+
+
+class ShardedViewMixin:
+    """Scope the queries of an API view to the shard of its user"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            self._shard_token = use_shard(shard_for_user(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            reset_shard(token)
+            self._shard_token = None
+
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ShardRouter:
+    """Route recipe data to the shard of the user who owns it"""
+
+    def _shard(self, model, hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+                return shard_for_user(instance)
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, 'user_id', None) is not None:
+                return shard_for_user(instance.user)
+
+        return _shard.get() or 'default'
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded():
+            return None
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are copied to every shard their data lives on
+        user_model = settings.AUTH_USER_MODEL.lower()
+        if user_model in (obj1._meta.label_lower, obj2._meta.label_lower):
+            return True
+
+        return None
@@ -0,0 +1,46 @@
+import gc
+import importlib
+import importlib.util
+import sys
+
+from django.conf import settings
+from django.urls import get_resolver
+
+
+def lazy_import(name):
+    """Return a module that is only executed on first attribute access
+
+    Returns None when the module is not installed, without importing it,
+    so optional dependencies can still be detected up front.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
+
+
+def preload():
+    """Load what requests would otherwise load lazily, in this process
+
+    Meant for the master process of a prefork server (e.g. gunicorn
+    --preload) so forked workers start warm: every view is imported by
+    resolving the URL configuration, then each of PRELOAD_MODULES, and
+    the objects created so far are frozen out of the garbage collector
+    so collections in the workers do not copy their pages.
+    """
+    get_resolver().url_patterns
+    for name in settings.PRELOAD_MODULES:
+        # Touching the namespace executes modules imported lazily
+        importlib.import_module(name).__dict__
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -0,0 +1,171 @@
+import mimetypes
+import os
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.urls import reverse
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+UPLOAD_SALT = 'core.storage.upload'
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@deconstructible
+class LocalObjectStorage(FileSystemStorage):
+    """Filesystem storage that emulates presigned direct uploads
+
+    Stands in for `S3ObjectStorage` on a single machine: the presigned URL
+    points at a signed endpoint of this app instead of at a bucket.
+    """
+
+    def presigned_upload(self, name, content_type, max_size):
+        """Return where and how a client can upload a file directly"""
+        token = signing.dumps(
+            {'name': name, 'max_size': max_size},
+            salt=UPLOAD_SALT
+        )
+
+        return {
+            'url': reverse('storage-upload', args=[token]),
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+        }
+
+    def read_prefix(self, name, length):
+        """Return the first `length` bytes of a stored file"""
+        with self.open(name) as stored:
+            return stored.read(length)
+
+    def receive_upload(self, token, stream, chunk_size=64 * 1024):
+        """Write a presigned upload to disk chunk by chunk"""
+        grant = signing.loads(
+            token,
+            salt=UPLOAD_SALT,
+            max_age=settings.MEDIA_UPLOAD_URL_EXPIRES
+        )
+        path = self.path(grant['name'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        received = 0
+        # Names are never written twice, cached copies stay valid
+        with open(path, 'xb') as upload:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                received += len(chunk)
+                if received > grant['max_size']:
+                    break
+                upload.write(chunk)
+        if received > grant['max_size']:
+            os.remove(path)
+            raise UploadTooLarge(grant['name'])
+
+        return grant['name']
+
+
+@deconstructible
+class S3ObjectStorage(Storage):
+    """Storage backed by an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    def __init__(self, bucket=None, endpoint_url=None):
+        self.bucket = bucket or settings.MEDIA_STORAGE_BUCKET
+        self.endpoint_url = endpoint_url or settings.MEDIA_STORAGE_ENDPOINT_URL
+
+    @cached_property
+    def client(self):
+        import boto3
+        from botocore.client import Config
+
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=settings.MEDIA_STORAGE_REGION,
+            aws_access_key_id=settings.MEDIA_STORAGE_ACCESS_KEY,
+            aws_secret_access_key=settings.MEDIA_STORAGE_SECRET_KEY,
+            config=Config(signature_version='s3v4')
+        )
+
+    def _head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as exc:
+            if exc.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+
+    def _open(self, name, mode='rb'):
+        body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        self.client.download_fileobj(self.bucket, name, body)
+        body.seek(0)
+
+        return File(body, name)
+
+    def _save(self, name, content):
+        content_type = getattr(content, 'content_type', None) or \
+            mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        content.seek(0)
+        # upload_fileobj sends large files as a multipart upload in chunks
+        self.client.upload_fileobj(
+            content, self.bucket, name,
+            ExtraArgs={
+                'ContentType': content_type,
+                'CacheControl': settings.MEDIA_CACHE_CONTROL,
+            }
+        )
+
+        return name
+
+    def read_prefix(self, name, length):
+        """Return the first `length` bytes of an object with a ranged GET"""
+        obj = self.client.get_object(
+            Bucket=self.bucket,
+            Key=name,
+            Range=f'bytes=0-{length - 1}'
+        )
+
+        return obj['Body'].read()
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        return self._head(name)['ContentLength']
+
+    def url(self, name):
+        return f'{settings.MEDIA_URL}{name}'
+
+    def presigned_upload(self, name, content_type, max_size):
+        """Return a presigned PUT straight to the bucket
+
+        A presigned PUT cannot cap the body size, the size is checked when
+        the upload is confirmed instead.
+        """
+        url = self.client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': name,
+                'ContentType': content_type,
+                'CacheControl': settings.MEDIA_CACHE_CONTROL,
+            },
+            ExpiresIn=settings.MEDIA_UPLOAD_URL_EXPIRES
+        )
+
+        return {
+            'url': url,
+            'method': 'PUT',
+            'headers': {
+                'Content-Type': content_type,
+                'Cache-Control': settings.MEDIA_CACHE_CONTROL,
+            },
+        }
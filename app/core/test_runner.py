@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner, default_test_processes
+
+
+class TimedTextTestResult(unittest.TextTestResult):
+    """Test result recording how long every test took"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.durations = []
+
+    def startTest(self, test):
+        self._started = time.monotonic()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        self.durations.append((time.monotonic() - self._started, test.id()))
+
+
+class TimedTestRunner(DiscoverRunner):
+    """Run tests in parallel by default and report the wall-clock time
+
+    Every worker process gets its own copy of the test databases. Pass
+    `--parallel 1` to run serially, which also lists the slowest tests.
+    """
+    slowest_count = 10
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(parallel=default_test_processes())
+
+    def get_resultclass(self):
+        return super().get_resultclass() or TimedTextTestResult
+
+    def run_suite(self, suite, **kwargs):
+        started = time.monotonic()
+        result = super().run_suite(suite, **kwargs)
+        self.report(result, time.monotonic() - started)
+
+        return result
+
+    def report(self, result, elapsed):
+        """Print the suite duration against TEST_WALL_CLOCK_TARGET"""
+        stream = result.stream
+        # Parallel runs replay results after the fact, timings are useless
+        if self.parallel <= 1 and getattr(result, 'durations', None):
+            stream.writeln('Slowest tests:')
+            for duration, test_id in sorted(result.durations,
+                                            reverse=True)[:self.slowest_count]:
+                stream.writeln(f'  {duration:.3f}s {test_id}')
+
+        target = settings.TEST_WALL_CLOCK_TARGET
+        stream.writeln(
+            f'Test suite took {elapsed:.1f}s with {self.parallel} '
+            f'process(es), target is {target}s'
+        )
+        if elapsed > target:
+            stream.writeln(
+                'WARNING: the test suite is slower than its target, '
+                'look at the slowest tests'
+            )
@@ -0,0 +1,39 @@
+from itertools import count
+
+from django.contrib.auth import get_user_model
+
+from core.models import Tag, Ingredient, Recipe
+
+
+_emails = (f'user{number}@example.com' for number in count(1))
+
+
+def sample_user(email=None, password='password', **params):
+    """Create and return a sample user, with a unique email by default"""
+    return get_user_model().objects.create_user(
+        email or next(_emails),
+        password,
+        **params
+    )
+
+
+def sample_tag(user, name='Main course'):
+    """Create and return a sample tag"""
+    return Tag.objects.create(user=user, name=name)
+
+
+def sample_ingredient(user, name='Sugar'):
+    """Create and return a sample ingredient"""
+    return Ingredient.objects.create(user=user, name=name)
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 1,
+        'price': 5.50
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
@@ -1,7 +1,13 @@
+from unittest.mock import patch
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connections
 from django.urls import reverse
 
+from core import admin
+from core.models import Tag, Recipe, Job
+
 
 class AdminSiteTests(TestCase):
 
@@ -39,3 +45,139 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def sample_recipes(self, count):
+        return [
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}',
+                                  time_minutes=10, price=5)
+            for i in range(count)
+        ]
+
+    def test_delete_user(self):
+        """Test that deleting a user deactivates them for the job"""
+        self.sample_recipes(1)
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+
+        res = self.client.get(url)
+        self.assertNotContains(res, 'Recipe 0')
+        self.client.post(url, {'post': 'yes'})
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+        self.assertTrue(Job.objects.filter(task='user.delete').exists())
+
+    def test_delete_users_action(self):
+        """Test that the bulk delete action schedules each user"""
+        url = reverse('admin:core_user_changelist')
+
+        self.client.post(url, {'action': 'delete_selected',
+                               '_selected_action': [self.user.id],
+                               'post': 'yes'})
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Job.objects.filter(task='user.delete').count(), 1)
+
+    def test_delete_recipes(self):
+        """Test that recipes deleted in the admin are purged later"""
+        recipe, other = self.sample_recipes(2)
+
+        self.client.post(reverse('admin:core_recipe_delete',
+                                 args=[recipe.id]), {'post': 'yes'})
+        self.client.post(reverse('admin:core_recipe_changelist'),
+                         {'action': 'delete_selected',
+                          '_selected_action': [other.id], 'post': 'yes'})
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(Recipe.all_objects.count(), 2)
+        self.assertEqual(
+            Job.objects.filter(task='recipe.purge_deleted').count(), 1
+        )
+
+    def test_recipes_listed_by_keyset(self):
+        """Test that the recipe list pages by primary key"""
+        recipes = self.sample_recipes(3)
+        url = reverse('admin:core_recipe_changelist')
+        with patch.object(admin.RecipeAdmin, 'list_per_page', 2):
+            res = self.client.get(url)
+            self.assertContains(res, 'Recipe 2')
+            self.assertContains(res, 'Recipe 1')
+            self.assertNotContains(res, 'Recipe 0')
+            self.assertContains(res, f'?after={recipes[1].id}')
+
+            res = self.client.get(url, {'after': recipes[1].id})
+            self.assertContains(res, 'Recipe 0')
+            self.assertNotContains(res, 'Recipe 1')
+            self.assertNotContains(res, '?after=')
+
+    def test_recipe_list_fixed_query_count(self):
+        """Test that listing recipes does not query per row"""
+        url = reverse('admin:core_recipe_changelist')
+        self.sample_recipes(2)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self.sample_recipes(5)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_recipe_change_page(self):
+        """Test that the recipe edit page works"""
+        recipe = self.sample_recipes(1)[0]
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_tag_name_taken_in_other_case(self):
+        """Test that a name clashing in another case is a form error"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        other = Tag.objects.create(user=self.user, name='Vegetarian')
+
+        res = self.client.post(reverse('admin:core_tag_add'),
+                               {'name': 'VEGAN', 'user': self.user.id})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.context['adminform'].form.errors['name'])
+
+        res = self.client.post(
+            reverse('admin:core_tag_change', args=[other.id]),
+            {'name': 'vegan ', 'user': self.user.id}
+        )
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.post(
+            reverse('admin:core_tag_change', args=[other.id]),
+            {'name': 'Veggie', 'user': self.user.id}
+        )
+        self.assertEqual(res.status_code, 302)
+
+    def test_tags_searched_by_prefix(self):
+        """Test that tags are searched by the start of their name"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Not vegan')
+        url = reverse('admin:core_tag_changelist')
+        res = self.client.get(url, {'q': 'veg'})
+
+        self.assertContains(res, 'Vegan')
+        self.assertNotContains(res, 'Not vegan')
+
+    def test_estimated_count_needs_postgres(self):
+        """Test that no estimate is made on other databases"""
+        queryset = Recipe.objects.all()
+        with patch.object(connections[queryset.db], 'vendor', 'sqlite'):
+            self.assertIsNone(admin.estimated_count(queryset))
+
+    def test_large_count_estimated(self):
+        """Test that only results over the exact count limit are estimated"""
+        self.sample_recipes(3)
+        queryset = Recipe.objects.order_by('-pk')
+        with self.settings(ADMIN_EXACT_COUNT_MAX=5):
+            paginator = admin.EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(paginator.count, 3)
+            self.assertFalse(paginator.estimated)
+
+        with self.settings(ADMIN_EXACT_COUNT_MAX=2), \
+                patch('core.admin.estimated_count', return_value=1000):
+            paginator = admin.EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(paginator.count, 1000)
+            self.assertTrue(paginator.estimated)
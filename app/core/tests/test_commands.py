@@ -1,8 +1,21 @@
+import os
+import signal
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+
+from core import profiling
+from core.models import Tag, Ingredient, Recipe, Change
+
+
+def settings_module():
+    """Return the settings module the tests run with"""
+    return os.environ['DJANGO_SETTINGS_MODULE']
 
 
 class CommandTests(TestCase):
@@ -21,3 +34,135 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_dedupe_recipe_attrs(self):
+        """Test merging tags whose names differ only in whitespace"""
+        user = get_user_model().objects.create_user(
+            'test@example.com',
+            'password'
+        )
+        # bulk_create skips the normalization done on save
+        Tag.objects.bulk_create([
+            Tag(user=user, name='Vegan'),
+            Tag(user=user, name=' Vegan '),
+        ])
+        kept, duplicate = Tag.objects.order_by('id')
+        recipe = Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=3
+        )
+        recipe.tags.add(kept, duplicate)
+
+        call_command('dedupe_recipe_attrs', stdout=StringIO())
+
+        self.assertEqual(list(Tag.objects.all()), [kept])
+        self.assertEqual(list(recipe.tags.all()), [kept])
+        self.assertTrue(Change.objects.filter(
+            kind=Change.KIND_TAG,
+            object_id=duplicate.id,
+            op=Change.OP_DELETE
+        ).exists())
+
+    def test_seed(self):
+        """Test generating users with recipes, tags and ingredients"""
+        call_command('seed', users=5, recipes=40, seed=7, processes=1,
+                     stdout=StringIO())
+
+        users = get_user_model().objects.filter(email__startswith='seed7-')
+        self.assertEqual(users.count(), 5)
+        self.assertEqual(Recipe.objects.filter(user__in=users).count(), 40)
+        self.assertTrue(Tag.objects.filter(user__in=users).exists())
+        self.assertTrue(Ingredient.objects.filter(user__in=users).exists())
+        self.assertTrue(
+            Recipe.ingredients.through.objects
+            .filter(recipe__user__in=users).exists()
+        )
+        self.assertEqual(
+            Change.objects.filter(kind=Change.KIND_RECIPE).count(), 40
+        )
+
+    def test_seed_reproducible(self):
+        """Test that the same seed generates the same recipes"""
+        def titles(seed):
+            call_command('seed', users=3, recipes=20, seed=seed,
+                         processes=1, stdout=StringIO())
+            recipes = Recipe.objects.filter(
+                user__email__startswith=f'seed{seed}-'
+            ).order_by('id')
+            result = [r.title for r in recipes]
+            get_user_model().objects.filter(
+                email__startswith=f'seed{seed}-'
+            ).delete()
+            return result
+
+        self.assertEqual(titles(3), titles(3))
+
+    def test_seed_existing_users(self):
+        """Test that seeding twice with the same seed is refused"""
+        call_command('seed', users=1, recipes=1, seed=1, processes=1,
+                     stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('seed', users=1, recipes=1, seed=1, processes=1,
+                         stdout=StringIO())
+
+    def test_benchmark_compression(self):
+        """Test measuring compression of generated recipe payloads"""
+        out = StringIO()
+        call_command('benchmark_compression', sizes='1,10',
+                     levels='gzip:1,9', repeat=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn('gzip', lines[1])
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_compression', levels='lz4:1',
+                         stdout=StringIO())
+
+    def test_bench_overhead(self):
+        """Test timing fresh processes of a settings module"""
+        out = StringIO()
+        call_command('bench_overhead', settings_modules=settings_module(),
+                     requests=2, starts=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn(settings_module(), lines[1])
+        self.assertIn('401', lines[1])
+
+    def test_profile_startup(self):
+        """Test breaking down the import time of a fresh worker"""
+        out = StringIO()
+        call_command('profile_startup', settings_module=settings_module(),
+                     top=3, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('Startup took'))
+        self.assertIn('django', out.getvalue())
+
+    @override_settings(PROFILE_DIR=tempfile.mkdtemp(),
+                       PROFILE_SIGNAL='SIGPROF')
+    def test_profile_worker(self):
+        """Test sampling a running process on a signal"""
+        number = signal.SIGPROF
+        previous = signal.getsignal(number)
+        profiling.install_signal_handler()
+        self.addCleanup(signal.signal, number, previous)
+        out, err = StringIO(), StringIO()
+
+        call_command('profile_worker', os.getpid(), seconds=0.2,
+                     stdout=out, stderr=err)
+
+        self.assertIn('profile_worker.handle', out.getvalue())
+        self.assertIn(f'samples from process {os.getpid()}', err.getvalue())
+
+    @override_settings(PROFILE_SIGNAL='')
+    def test_profile_worker_no_signal(self):
+        """Test that profiling needs workers to handle a signal"""
+        with self.assertRaises(CommandError):
+            call_command('profile_worker', os.getpid(), seconds=1)
+
+    @override_settings(PROFILE_SIGNAL='SIGPROF')
+    def test_profile_worker_no_process(self):
+        """Test that profiling a process that does not exist fails"""
+        with self.assertRaises(CommandError):
+            call_command('profile_worker', 2 ** 22 + 1, seconds=1)
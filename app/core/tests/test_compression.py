@@ -0,0 +1,90 @@
+import gzip
+import json
+from unittest import skipUnless
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import compression
+
+
+BODY = json.dumps([{'title': 'Tomato soup', 'price': '5.50'}] * 100)
+
+
+def respond(response, accept_encoding='gzip'):
+    """Run a response through the middleware for a given request"""
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    middleware = compression.CompressionMiddleware(lambda request: response)
+
+    return middleware(request)
+
+
+class CompressionTests(SimpleTestCase):
+    """Test compressing responses"""
+
+    def test_negotiate(self):
+        """Test picking the coding by q value, then server preference"""
+        with override_settings(COMPRESSION_CODECS=('zstd', 'gzip')):
+            self.assertEqual(compression.negotiate('gzip, deflate'), 'gzip')
+            self.assertEqual(
+                compression.negotiate('gzip;q=1.0, *;q=0.5'),
+                'gzip'
+            )
+            self.assertIsNone(compression.negotiate('gzip;q=0'))
+            self.assertIsNone(compression.negotiate(''))
+
+    def test_compress_json(self):
+        """Test that JSON bodies are gzipped for gzip clients"""
+        res = respond(HttpResponse(BODY, content_type='application/json'))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        self.assertEqual(gzip.decompress(res.content).decode(), BODY)
+
+    def test_skip_small_and_compressed_bodies(self):
+        """Test that small bodies and images are sent as they are"""
+        small = respond(HttpResponse('{}', content_type='application/json'))
+        image = respond(HttpResponse(BODY, content_type='image/jpeg'))
+
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+        self.assertEqual(image.content.decode(), BODY)
+
+    def test_no_accepted_coding(self):
+        """Test that clients not asking for compression get plain bodies"""
+        res = respond(
+            HttpResponse(BODY, content_type='application/json'),
+            accept_encoding='identity'
+        )
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+
+    def test_compress_stream(self):
+        """Test that streaming bodies are compressed chunk by chunk"""
+        response = StreamingHttpResponse(
+            (BODY[i:i + 500] for i in range(0, len(BODY), 500)),
+            content_type='application/json'
+        )
+        response['ETag'] = '"abc"'
+        res = respond(response)
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['ETag'], 'W/"abc"')
+        body = gzip.decompress(b''.join(res.streaming_content))
+        self.assertEqual(body.decode(), BODY)
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        """Test that brotli is preferred when the client accepts it"""
+        res = respond(
+            HttpResponse(BODY, content_type='application/json'),
+            accept_encoding='gzip, br'
+        )
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(
+            compression.brotli.decompress(res.content).decode(),
+            BODY
+        )
@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import dbrouters
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+@patch('core.dbrouters.is_reachable', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = dbrouters.ReplicaRouter()
+        self.read_from = []
+
+        def view(request):
+            self.read_from.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def request(self, method, token='abc'):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        return self.middleware(self.factory.generic(
+            method, '/api/recipe/recipes/', **headers
+        ))
+
+    def test_safe_requests_read_from_replica(self, reachable):
+        """Test that GET requests are served by one of the replicas"""
+        self.request('GET')
+
+        self.assertIn(self.read_from[0], ['replica_1', 'replica_2'])
+
+    def test_unsafe_requests_use_primary(self, reachable):
+        """Test that writing requests read from the primary"""
+        self.request('POST')
+
+        self.assertEqual(self.read_from, [None])
+
+    def test_reads_pinned_to_primary_after_write(self, reachable):
+        """Test that a client reads its own writes from the primary"""
+        self.request('PATCH')
+        self.request('GET')
+
+        self.assertEqual(self.read_from, [None, None])
+
+    def test_clients_on_one_address_not_pinned(self, reachable):
+        """Test that a write only pins the client that made it"""
+        self.request('PATCH', token='abc')
+        self.request('GET', token='def')
+
+        self.assertIn(self.read_from[1], ['replica_1', 'replica_2'])
+
+    def test_anonymous_pinned_by_address(self, reachable):
+        """Test that clients without credentials are told apart by address"""
+        self.request('POST', token=None)
+        self.request('GET', token=None)
+
+        self.assertEqual(self.read_from, [None, None])
+
+    def test_tokens_read_from_primary(self, reachable):
+        """Test that tokens are read from the primary, as logins create them"""
+        def view(request):
+            self.read_from.append(self.router.db_for_read(Token))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+
+        self.assertEqual(self.read_from, [None])
+
+    def test_unhealthy_replicas_fall_back_to_primary(self, reachable):
+        """Test that reads go to the primary when no replica is up"""
+        reachable.return_value = False
+        self.request('GET')
+
+        self.assertEqual(self.read_from, [None])
+
+    def test_no_replica_outside_request(self, reachable):
+        """Test that reads outside of a request use the primary"""
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+
+class ReplicaHealthTests(SimpleTestCase):
+
+    @override_settings(DATABASE_REPLICA_RETRY_SECONDS=60)
+    @patch('core.dbrouters.connections')
+    def test_unreachable_replica_skipped(self, connections):
+        """Test that a failing replica is not retried until its backoff"""
+        connections.__getitem__.return_value.ensure_connection \
+            .side_effect = OperationalError
+
+        self.assertFalse(dbrouters.is_reachable('replica_9'))
+        self.assertFalse(dbrouters.is_reachable('replica_9'))
+        self.assertEqual(connections.__getitem__.call_count, 1)
+        dbrouters._unhealthy.clear()
+
+
+class ReplicaSettingsTests(SimpleTestCase):
+
+    def import_settings(self, **env):
+        return subprocess.run(
+            [sys.executable, '-c', 'import app.settings'],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path),
+                     DB_REPLICA_HOSTS='replica1', **env),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+    def test_replicas_need_shared_cache(self):
+        """Test that replicas with a per process cache fail at startup"""
+        result = self.import_settings()
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured', result.stderr)
+
+        result = self.import_settings(
+            CACHE_BACKEND='django.core.cache.backends.memcached'
+                          '.PyLibMCCache',
+            CACHE_LOCATION='127.0.0.1:11211'
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+    return value * 2
+
+
+@jobs.task('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run_job(self):
+        """Test that a queued job runs and stores its result"""
+        job = jobs.enqueue('tests.record', value=21)
+        jobs.run_pending()
+        job.refresh_from_db()
+
+        self.assertEqual(calls, [21])
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, '42')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job_is_retried_later(self):
+        """Test that a failing job is requeued with a backoff"""
+        job = jobs.enqueue('tests.fail')
+        jobs.run_pending()
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.claim('worker'), [])
+
+    def test_job_fails_after_max_attempts(self):
+        """Test that a job is marked failed once retries are used up"""
+        job = jobs.enqueue('tests.fail', max_attempts=1)
+        jobs.run_pending()
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+
+    def test_claimed_job_hidden_until_visibility_timeout(self):
+        """Test that a claimed job is only handed out again after timeout"""
+        job = jobs.enqueue('tests.record', value=1)
+        self.assertEqual(jobs.claim('worker-1'), [job])
+        self.assertEqual(jobs.claim('worker-2'), [])
+
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        reclaimed = jobs.claim('worker-2')
+
+        self.assertEqual(reclaimed, [job])
+        self.assertEqual(reclaimed[0].attempts, 2)
+
+    def test_stale_worker_cannot_overwrite_reclaimed_job(self):
+        """Test that a run after losing the claim does not record results"""
+        jobs.enqueue('tests.record', value=1)
+        stale = jobs.claim('worker-1')[0]
+        Job.objects.filter(pk=stale.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        jobs.claim('worker-2')
+        jobs.run_job(stale)
+
+        self.assertEqual(
+            Job.objects.get(pk=stale.pk).status,
+            Job.STATUS_RUNNING
+        )
+
+    @patch('core.jobs.autodiscover')
+    def test_run_workers_burst(self, autodiscover):
+        """Test the worker command drains the queue in burst mode"""
+        jobs.enqueue('tests.record', value=1)
+        jobs.enqueue('tests.record', value=2)
+        call_command('run_workers', processes=1, threads=1, burst=True,
+                     stdout=StringIO())
+
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertFalse(
+            Job.objects.exclude(status=Job.STATUS_SUCCEEDED).exists()
+        )
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+
+class MediaServingTests(TestCase):
+    """Test serving stored media files"""
+
+    def setUp(self):
+        self.client = Client()
+        self.name = default_storage.save(
+            'tests/media.txt',
+            ContentFile(b'0123456789')
+        )
+        self.url = default_storage.url(self.name)
+
+    def tearDown(self):
+        default_storage.delete(self.name)
+
+    def test_serve_media_cached_for_good(self):
+        """Test that media is served with immutable cache headers"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'0123456789')
+        self.assertEqual(res['Cache-Control'], settings.MEDIA_CACHE_CONTROL)
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', res)
+
+    def test_serve_media_not_modified(self):
+        """Test that a matching If-None-Match gets a 304"""
+        etag = self.client.get(self.url)['ETag']
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+        for header in (f'"other", W/{etag}', '*'):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, 304)
+
+    def test_serve_media_other_etag(self):
+        """Test that an ETag merely containing the current one is no match"""
+        etag = self.client.get(self.url)['ETag']
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'x{etag}')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_serve_media_range(self):
+        """Test serving part of a file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), b'2345')
+        self.assertEqual(res['Content-Range'], 'bytes 2-5/10')
+
+    def test_serve_media_suffix_range(self):
+        """Test serving the last bytes of a file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), b'789')
+
+    def test_serve_media_range_not_satisfiable(self):
+        """Test that a range past the end of the file gets a 416"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], 'bytes */10')
+
+    def test_serve_media_stale_if_range(self):
+        """Test that a range for another version gets the whole file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=2-5',
+                              HTTP_IF_RANGE='"other"')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_serve_media_missing(self):
+        """Test that missing files and paths outside media are not found"""
+        self.assertEqual(
+            self.client.get(f'{settings.MEDIA_URL}missing.txt').status_code,
+            404
+        )
+        self.assertEqual(
+            self.client.get(f'{settings.MEDIA_URL}../secret').status_code,
+            404
+        )
+
+    @override_settings(DEFAULT_FILE_STORAGE='core.storage.S3ObjectStorage')
+    def test_serve_media_other_storage(self):
+        """Test that media of storages without local files is not found"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 404)
+
+
+class StorageUploadTests(TestCase):
+    """Test the upload endpoint of local storage"""
+
+    @override_settings(DEFAULT_FILE_STORAGE='core.storage.S3ObjectStorage')
+    def test_upload_other_storage(self):
+        """Test that storages presigning their own URLs get a 404"""
+        res = Client().put(reverse('storage-upload', args=['token']),
+                           b'data', content_type='image/jpeg')
+
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,143 @@
+import json
+import logging
+import time
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, \
+    override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.logs import JsonFormatter
+from core.middleware import AccessLogMiddleware
+from core.tests.factories import sample_user, sample_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class AccessLogTests(TestCase):
+    """Test logging and timing requests"""
+
+    def setUp(self):
+        metrics.REQUEST_DURATION.reset()
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_access_log(self):
+        """Test that a request is logged with its route, user and queries"""
+        sample_recipe(user=self.user)
+
+        with self.assertLogs('app.access', 'INFO') as logs:
+            self.client.get(RECIPES_URL)
+
+        fields = logs.records[0].fields
+        self.assertEqual(fields['route'], 'api/recipe/recipes/$')
+        self.assertEqual(fields['view'], 'recipe:recipe-list')
+        self.assertEqual(fields['status'], 200)
+        self.assertEqual(fields['user_id'], self.user.pk)
+        self.assertGreater(fields['queries'], 0)
+        self.assertGreater(fields['bytes'], 0)
+        self.assertIn('duration_ms', fields)
+
+    @override_settings(METRICS_PUBLIC=True)
+    def test_metrics(self):
+        """Test that requests are counted per route in /metrics"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res['Content-Type'], 'text/plain; version=0.0.4')
+        self.assertIn(
+            'http_request_duration_seconds_count{route="api/recipe/recipes/$",'
+            'method="GET",status="200"} 2',
+            res.content.decode()
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test that /metrics asks for the token when one is set"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+        res = self.client.get(METRICS_URL,
+                              HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_metrics_closed_by_default(self):
+        """Test that /metrics is forbidden without a token or opt in"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 403)
+
+
+def slow_view(request):
+    time.sleep(0.15)
+    return HttpResponse('done')
+
+
+class SlowRequestTests(SimpleTestCase):
+    """Test capturing the details of slow requests"""
+
+    @override_settings(SLOW_REQUEST_SECONDS=0.1)
+    def test_slow_request(self):
+        """Test that a slow request is logged with sampled stacks"""
+        middleware = AccessLogMiddleware(slow_view)
+
+        with self.assertLogs('app.slow_requests', 'WARNING') as logs:
+            middleware(RequestFactory().get('/slow'))
+
+        fields = logs.records[0].fields
+        self.assertEqual(fields['route'], 'unmatched')
+        self.assertEqual(fields['sql'], [])
+        self.assertTrue(any(
+            f'{__name__}.slow_view' in stack for stack in fields['stacks']
+        ))
+
+    @override_settings(SLOW_REQUEST_SECONDS=10)
+    def test_fast_request(self):
+        """Test that requests under the threshold are not reported"""
+        middleware = AccessLogMiddleware(lambda request: HttpResponse())
+
+        with self.assertLogs('app.access', 'INFO'):
+            with self.assertRaises(AssertionError):
+                with self.assertLogs('app.slow_requests', 'WARNING'):
+                    middleware(RequestFactory().get('/'))
+
+
+class MetricsFormatTests(SimpleTestCase):
+    """Test the metric and log formats"""
+
+    def test_histogram(self):
+        """Test rendering a histogram as cumulative buckets"""
+        histogram = metrics.Histogram('latency', 'Latency', ('route',),
+                                      (0.1, 1.0))
+        histogram.observe(0.05, route='a')
+        histogram.observe(0.5, route='a')
+        histogram.observe(5, route='a"b')
+
+        text = histogram.render()
+
+        self.assertIn('latency_bucket{route="a",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{route="a",le="1.0"} 2', text)
+        self.assertIn('latency_bucket{route="a",le="+Inf"} 2', text)
+        self.assertIn('latency_sum{route="a"} 0.55', text)
+        self.assertIn('latency_count{route="a\\"b"} 1', text)
+
+    def test_json_formatter(self):
+        """Test that log records are formatted as one JSON object"""
+        record = logging.makeLogRecord({
+            'name': 'app.access', 'levelname': 'INFO', 'msg': 'GET /',
+            'fields': {'status': 200},
+        })
+
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data['message'], 'GET /')
+        self.assertEqual(data['status'], 200)
+        self.assertEqual(data['logger'], 'app.access')
@@ -1,5 +1,7 @@
 from unittest.mock import patch
 
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_delete
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -86,3 +88,37 @@ class ModelTests(TestCase):
         exp_path = f'uploads/recipe/{uuid}.jpg'
 
         self.assertEqual(file_path, exp_path)
+
+    def test_delete_user_not_logged(self):
+        """Test that objects deleted with a user are not logged"""
+        user = sample_user()
+        models.Recipe.objects.create(user=user, title='Steak',
+                                     time_minutes=5, price=5)
+        user_id = user.pk
+
+        user.delete()
+        other = sample_user('other@example.com')
+        models.Tag.objects.create(user=other, name='Vegan')
+        get_user_model().objects.filter(pk=other.pk).delete()
+
+        self.assertFalse(models.Change.objects.filter(
+            user_id__in=[user_id, other.pk]
+        ).exists())
+
+    def test_failed_user_delete_keeps_logging(self):
+        """Test that changes of a user are logged after a failed delete"""
+        user = sample_user()
+        models.Recipe.objects.create(user=user, title='Steak',
+                                     time_minutes=5, price=5)
+
+        def fail(**kwargs):
+            raise DatabaseError
+
+        post_delete.connect(fail, sender=models.Recipe)
+        self.addCleanup(post_delete.disconnect, fail, sender=models.Recipe)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            user.delete()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+
+        self.assertTrue(models.Change.objects.filter(object_id=tag.id)
+                        .exists())
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, \
+    override_settings
+from rest_framework.authtoken.models import Token
+
+from core import middleware
+from core.middleware import ProfileMiddleware
+from core.tests.factories import sample_user
+
+
+# Loads the app from another thread as the runserver autoreloader does
+LOAD_IN_THREAD = """
+import threading
+
+errors = []
+
+
+def load():
+    try:
+        import app.wsgi  # noqa
+    except Exception as exc:
+        errors.append(exc)
+
+
+thread = threading.Thread(target=load)
+thread.start()
+thread.join()
+assert not errors, errors
+"""
+
+
+def busy_view(request):
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        pass
+    return HttpResponse('done', status=201)
+
+
+def profile(user, path='/', **extra):
+    """Run a request by `user` through the middleware"""
+    request = RequestFactory().get(path, **extra)
+    if user is not None:
+        request.user = user
+
+    return ProfileMiddleware(busy_view)(request)
+
+
+@override_settings(REQUEST_PROFILING=True)
+class ProfileMiddlewareTests(SimpleTestCase):
+    """Test profiling single requests"""
+
+    def setUp(self):
+        self.staff = get_user_model()(email='staff@example.com',
+                                      is_staff=True)
+
+    def test_profile_header(self):
+        """Test that staff get folded stacks for a flagged request"""
+        res = profile(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Profile-Status'], '201')
+        self.assertGreater(int(res['X-Profile-Samples']), 0)
+        self.assertIn(f'{__name__}.busy_view', res.content.decode())
+        for line in res.content.decode().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(count.isdigit())
+
+    def test_profile_query(self):
+        """Test asking for the profile in the query string"""
+        res = profile(self.staff, '/?profile=1')
+
+        self.assertIn('X-Profile-Status', res)
+
+    def test_profile_not_staff(self):
+        """Test that other users get the response itself"""
+        user = get_user_model()(email='user@example.com')
+
+        for requester in (user, AnonymousUser()):
+            with patch('core.middleware.StackSampler') as sampler:
+                res = profile(requester, HTTP_X_PROFILE='1')
+
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(res.content, b'done')
+            sampler.assert_not_called()
+
+    def test_profile_one_at_a_time(self):
+        """Test that staff get the response while another is profiled"""
+        with middleware._profiling:
+            res = profile(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 201)
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_profiling_off(self):
+        """Test that requests are not profiled unless turned on"""
+        res = profile(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 201)
+
+
+@override_settings(REQUEST_PROFILING=True)
+class ProfileTokenTests(TestCase):
+    """Test profiling requests of API clients"""
+
+    def test_profile_staff_token(self):
+        """Test that the token of a staff user is checked up front"""
+        staff = sample_user('staff@example.com', is_staff=True)
+        user = sample_user('user@example.com')
+
+        token = Token.objects.create(user=staff)
+
+        res = profile(None, HTTP_X_PROFILE='1',
+                      HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertIn('X-Profile-Status', res)
+
+        for header in (f'Token {Token.objects.create(user=user)}',
+                       'Token invalid'):
+            res = profile(None, HTTP_X_PROFILE='1',
+                          HTTP_AUTHORIZATION=header)
+            self.assertEqual(res.status_code, 201)
+
+
+class SignalHandlerTests(SimpleTestCase):
+    """Test setting up profiling on a signal"""
+
+    def test_load_app_outside_main_thread(self):
+        """Test that the app loads from a thread with a profile signal"""
+        result = subprocess.run(
+            [sys.executable, '-c', LOAD_IN_THREAD],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path),
+                     PROFILE_SIGNAL='SIGPROF'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
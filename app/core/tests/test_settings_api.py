@@ -0,0 +1,42 @@
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app import settings_api
+from core.tests.factories import sample_user
+
+
+@override_settings(ROOT_URLCONF='app.urls_api',
+                   MIDDLEWARE=settings_api.MIDDLEWARE)
+class ApiProfileTests(TestCase):
+    """Test serving the API with the API only profile"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_profile_drops_browser_stack(self):
+        """Test that session, messages and admin are left out"""
+        self.assertNotIn('django.contrib.admin', settings_api.INSTALLED_APPS)
+        self.assertNotIn('django.contrib.sessions',
+                         settings_api.INSTALLED_APPS)
+        self.assertFalse(any(
+            'Session' in middleware or 'Csrf' in middleware
+            for middleware in settings_api.MIDDLEWARE
+        ))
+
+    def test_admin_not_routed(self):
+        """Test that the admin is not served"""
+        res = self.client.get('/admin/')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_token_authenticated_api(self):
+        """Test that token authenticated calls work without sessions"""
+        token = Token.objects.create(user=sample_user())
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.post('/api/recipe/tags/', {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
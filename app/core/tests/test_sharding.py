@@ -0,0 +1,102 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import sharding
+from core.models import Tag, Ingredient, Recipe
+
+
+class HashRingTests(SimpleTestCase):
+
+    def test_keys_spread_over_nodes(self):
+        """Test that every node receives a fair share of keys"""
+        ring = sharding.HashRing(['a', 'b', 'c', 'd'])
+        counts = {}
+        for key in range(10000):
+            node = ring.get(key)
+            counts[node] = counts.get(node, 0) + 1
+
+        self.assertEqual(set(counts), {'a', 'b', 'c', 'd'})
+        for count in counts.values():
+            self.assertGreater(count, 1800)
+
+    def test_adding_node_moves_few_keys(self):
+        """Test that a new node only takes keys, never reshuffles others"""
+        before = sharding.HashRing(['a', 'b', 'c'])
+        after = sharding.HashRing(['a', 'b', 'c', 'd'])
+        moved = [
+            key for key in range(10000)
+            if before.get(key) != after.get(key)
+        ]
+
+        self.assertLess(len(moved), 3500)
+        self.assertTrue(all(after.get(key) == 'd' for key in moved))
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, 'needs several shards')
+class ShardRoutingTests(TestCase):
+    databases = '__all__'
+
+    def create_user(self, email):
+        return get_user_model().objects.create_user(email, 'password')
+
+    def test_new_user_placed_on_ring_shard(self):
+        """Test that a new user is assigned the shard the ring picks"""
+        user = self.create_user('test@example.com')
+
+        self.assertEqual(user.shard, sharding.get_ring().get(user.pk))
+
+    def test_recipe_data_stored_on_user_shard(self):
+        """Test that the API writes and reads recipes on the user shard"""
+        user = self.create_user('test@example.com')
+        client = APIClient()
+        client.force_authenticate(user)
+        tag = client.post(reverse('recipe:tag-list'), {'name': 'Vegan'})
+        client.post(reverse('recipe:recipe-list'), {
+            'title': 'Salad',
+            'time_minutes': 5,
+            'price': '3.00',
+            'tags': [tag.data['id']],
+        })
+        res = client.get(reverse('recipe:recipe-list'))
+
+        recipes = Recipe.objects.using(user.shard).filter(user=user)
+        self.assertEqual(recipes.count(), 1)
+        self.assertEqual(res.data[0]['tags'], [tag.data['id']])
+        for alias in settings.DATABASE_SHARDS:
+            if alias != user.shard:
+                self.assertFalse(Recipe.objects.using(alias).exists())
+
+    def test_rebalance_moves_user_data(self):
+        """Test moving a user to another shard keeps all relations"""
+        user = self.create_user('test@example.com')
+        source = user.shard
+        target = next(a for a in settings.DATABASE_SHARDS if a != source)
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Kale')
+        recipe = Recipe.objects.create(user=user, title='Salad',
+                                       time_minutes=5, price=3)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        call_command('rebalance_shards', user=user.email, target=target,
+                     stdout=StringIO())
+        user.refresh_from_db()
+        moved = Recipe.objects.using(target).get(user=user)
+
+        self.assertEqual(user.shard, target)
+        self.assertFalse(Recipe.objects.using(source).exists())
+        self.assertFalse(Tag.objects.using(source).exists())
+        self.assertEqual(moved.title, 'Salad')
+        self.assertEqual([t.name for t in moved.tags.all()], ['Vegan'])
+        self.assertEqual(
+            [i.name for i in moved.ingredients.all()],
+            ['Kale']
+        )
@@ -0,0 +1,37 @@
+import gc
+import sys
+
+from django.test import SimpleTestCase, override_settings
+
+from core import startup
+
+
+class StartupTests(SimpleTestCase):
+    """Test loading modules lazily or up front"""
+
+    def tearDown(self):
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def test_lazy_import(self):
+        """Test that a lazy module works once it is used"""
+        sys.modules.pop('colorsys', None)
+        colorsys = startup.lazy_import('colorsys')
+
+        self.assertIs(sys.modules['colorsys'], colorsys)
+        self.assertEqual(colorsys.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+
+    def test_lazy_import_missing(self):
+        """Test that a missing module is reported as None"""
+        self.assertIsNone(startup.lazy_import('no_such_module_here'))
+
+    @override_settings(PRELOAD_MODULES=['colorsys'])
+    def test_preload(self):
+        """Test loading lazily imported modules up front"""
+        sys.modules.pop('colorsys', None)
+        colorsys = startup.lazy_import('colorsys')
+        startup.preload()
+
+        self.assertIn('rgb_to_hsv', object.__getattribute__(
+            colorsys, '__dict__'
+        ))
@@ -0,0 +1,116 @@
+import time
+from threading import Thread
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import TokenBucketThrottle
+
+
+TAGS_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+
+
+_time = time.time
+
+
+def slow_time():
+    """Return the time after a pause, letting other threads interleave"""
+    time.sleep(0.001)
+    return _time()
+
+
+def rates(**scopes):
+    """Return REST framework settings with the given throttle rates"""
+    return {
+        'DEFAULT_THROTTLE_CLASSES': (
+            'core.throttling.TokenBucketThrottle',
+        ),
+        'DEFAULT_THROTTLE_RATES': scopes,
+    }
+
+
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK=rates(read='2/min', write='5/min'))
+    def test_requests_over_rate_throttled(self):
+        """Test that a client is throttled once its bucket is empty"""
+        first = self.client.get(TAGS_URL)
+        second = self.client.get(TAGS_URL)
+        third = self.client.get(TAGS_URL)
+
+        self.assertEqual(first['X-RateLimit-Limit'], '2')
+        self.assertEqual(first['X-RateLimit-Remaining'], '1')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second['X-RateLimit-Remaining'], '0')
+        self.assertEqual(third.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(third['Retry-After'], '30')
+
+    @override_settings(REST_FRAMEWORK=rates(read='1/min', write='5/min'))
+    def test_scopes_have_separate_buckets(self):
+        """Test that reads being throttled does not block writes"""
+        self.client.get(TAGS_URL)
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res['X-RateLimit-Limit'], '5')
+
+    @override_settings(REST_FRAMEWORK=rates(read='1/min'))
+    def test_users_have_separate_buckets(self):
+        """Test that one user hitting the limit does not affect others"""
+        self.client.get(TAGS_URL)
+        user2 = get_user_model().objects.create_user(
+            'new@example.com',
+            'password'
+        )
+        client2 = APIClient()
+        client2.force_authenticate(user2)
+
+        self.assertEqual(client2.get(TAGS_URL).status_code,
+                         status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=rates(login='1/min'))
+    def test_login_throttled(self):
+        """Test that token requests are limited per client address"""
+        client = APIClient()
+        payload = {'email': 'test@example.com', 'password': 'wrong'}
+        client.post(TOKEN_URL, payload)
+        res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rates(read='5/min'))
+    def test_concurrent_requests_share_bucket(self):
+        """Test that concurrent requests cannot spend the same token"""
+        request = SimpleNamespace(method='GET', user=self.user)
+        results = []
+
+        def check():
+            view = SimpleNamespace(headers={})
+            results.append(TokenBucketThrottle().allow_request(request, view))
+
+        threads = [Thread(target=check) for _ in range(20)]
+        with patch('time.time', side_effect=slow_time):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results.count(True), 5)
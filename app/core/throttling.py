@@ -0,0 +1,96 @@
+import math
+import time
+
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Seconds a bucket lock outlives a worker that died holding it
+LOCK_TIMEOUT = 1
+# Tries and seconds between them to take a bucket lock
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+
+
+def parse_rate(rate):
+    """Return (requests, seconds) for a rate such as '100/min'"""
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket throttle with its state in the shared throttle cache
+
+    The bucket is kept as a single timestamp per client (the generic cell
+    rate algorithm). It is read and written under a lock taken with the
+    atomic `cache.add`, so concurrent requests of a client on different
+    workers cannot both spend the same token. A client may burst up to
+    the full rate, then gets one request every period/rate seconds. The
+    scope is taken from the view's `throttle_scope`, falling back to
+    `read` or `write` by method.
+    """
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_cache_key(self, request, scope):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+
+        return f'throttle:{scope}:{ident}'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        limit, period = parse_rate(rate)
+        interval = period / limit
+
+        cache = caches['throttle']
+        key = self.get_cache_key(request, scope)
+        if not self.lock(cache, key):
+            # Other requests of the client hold the bucket, count as busy
+            self.wait_time = interval
+            return False
+        try:
+            now = time.time()
+            arrival = max(cache.get(key, now), now)
+            allowed = arrival - period + interval <= now
+            if allowed:
+                arrival += interval
+                cache.set(key, arrival, math.ceil(period))
+        finally:
+            cache.delete(f'{key}:lock')
+        self.wait_time = arrival - period + interval - now
+
+        view.headers.update({
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(
+                max(0, int((now - arrival + period) / interval))
+            ),
+            'X-RateLimit-Reset': str(math.ceil(arrival - now)),
+        })
+
+        return allowed
+
+    def lock(self, cache, key):
+        """Take the lock of a bucket, False if it stays taken"""
+        for attempt in range(LOCK_ATTEMPTS):
+            if cache.add(f'{key}:lock', True, LOCK_TIMEOUT):
+                return True
+            time.sleep(LOCK_WAIT)
+
+        return False
+
+    def wait(self):
+        return max(0, self.wait_time)
@@ -0,0 +1,160 @@
+import hmac
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, \
+    HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import parse_etags
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, \
+    require_safe
+
+from core import metrics as core_metrics
+from core.storage import UploadTooLarge
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def storage_upload(request, token):
+    """Accept a direct upload to a URL presigned by LocalObjectStorage"""
+    # Other storages presign URLs of their own
+    if not hasattr(default_storage, 'receive_upload'):
+        raise Http404(token)
+    try:
+        default_storage.receive_upload(token, request)
+    except signing.BadSignature:
+        return HttpResponseForbidden()
+    except UploadTooLarge:
+        return HttpResponse(status=413)
+    except FileExistsError:
+        return HttpResponse(status=409)
+
+    return HttpResponse(status=200)
+
+
+def parse_range(header, size):
+    """Return the (start, end) byte range asked for, None for all bytes
+
+    Only single ranges are supported, a request for several ranges gets
+    the whole file. Raises ValueError if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+
+    return start, end
+
+
+def _read_range(stream, length, chunk_size=64 * 1024):
+    with stream:
+        while length > 0:
+            chunk = stream.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a stored media file with long-lived cache headers
+
+    Stored names are never reused for other content, so responses may be
+    cached for good. Supports conditional requests and single byte
+    ranges.
+    """
+    if not isinstance(default_storage, FileSystemStorage):
+        raise Http404(path)
+    try:
+        full_path = default_storage.path(path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404(path)
+    if not os.path.isfile(full_path):
+        raise Http404(path)
+
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': settings.MEDIA_CACHE_CONTROL,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    # Weak comparison, as RFC 7232 asks for If-None-Match
+    matches = {
+        tag[2:] if tag.startswith('W/') else tag
+        for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    }
+    if etag in matches or '*' in matches:
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        try:
+            byte_range = parse_range(
+                request.META.get('HTTP_RANGE'),
+                stat.st_size
+            )
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or \
+        'application/octet-stream'
+    stream = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(stream, content_type=content_type)
+    else:
+        start, end = byte_range
+        stream.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(stream, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
+
+
+@require_safe
+def metrics(request):
+    """Serve the metrics of this worker in the Prometheus text format
+
+    Forbidden without the METRICS_TOKEN bearer token, or to everyone when
+    no token is set, unless METRICS_PUBLIC opens it.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        given = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(given.encode(), expected.encode()):
+            return HttpResponseForbidden()
+    elif not settings.METRICS_PUBLIC:
+        return HttpResponseForbidden()
+
+    return HttpResponse(core_metrics.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        from recipe import similarity, stats
+
+        similarity.connect()
+        stats.connect()
@@ -0,0 +1,119 @@
+from django.utils.translation import gettext_lazy as _
+
+from core import changelog
+from core.models import Tag, Ingredient, Recipe, Change
+
+from recipe import serializers, similarity, stats
+from recipe.relations import diff_relation
+
+
+# Recipe relations a bulk update can replace, with their through column
+RELATIONS = (
+    ('tags', Tag, 'tag_id'),
+    ('ingredients', Ingredient, 'ingredient_id'),
+)
+
+
+class BulkUpdateError(Exception):
+    """Bulk update rejected, `errors` holds one dict per item"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def validate_items(user, items, partial):
+    """Validate bulk update items, return them with the recipes they hit
+
+    Every item is checked on its own first, then ids and related objects
+    of all items are looked up with one query per model.
+    """
+    errors = [{} for _ in items]
+    valid = {}
+    seen = set()
+    for index, item in enumerate(items):
+        serializer = serializers.RecipeBulkItemSerializer(
+            data=item,
+            partial=partial
+        )
+        if not serializer.is_valid():
+            errors[index] = serializer.errors
+        elif 'id' not in serializer.validated_data:
+            errors[index] = {'id': [_('This field is required.')]}
+        elif serializer.validated_data['id'] in seen:
+            errors[index] = {'id': [_('Duplicate id.')]}
+        else:
+            seen.add(serializer.validated_data['id'])
+            valid[index] = serializer.validated_data
+
+    recipes = Recipe.objects.filter(
+        user=user,
+        id__in=[data['id'] for data in valid.values()]
+    ).in_bulk()
+    for name, model, column in RELATIONS:
+        referenced = {
+            pk for data in valid.values() for pk in data.get(name, ())
+        }
+        owned = set(
+            model.objects.filter(user=user, id__in=referenced)
+            .values_list('id', flat=True)
+        ) if referenced else set()
+        for index, data in valid.items():
+            unknown = [pk for pk in data.get(name, ()) if pk not in owned]
+            if unknown:
+                errors[index][name] = [
+                    _('Invalid pk "%s" - object does not exist.') % pk
+                    for pk in unknown
+                ]
+    for index, data in valid.items():
+        if data['id'] not in recipes:
+            errors[index]['id'] = [_('Not found.')]
+
+    if any(errors):
+        raise BulkUpdateError(errors)
+
+    return list(valid.values()), recipes
+
+
+def update_recipes(user, items, partial=True):
+    """Apply a list of recipe changes of a user, return updated recipes
+
+    Scalar fields are written with one `bulk_update` and relations are
+    diffed against the through tables. Nothing is written if any item is
+    invalid. Call it inside a transaction so the batch applies as a whole.
+    """
+    changes, recipes = validate_items(user, items, partial)
+
+    relations = {name for name, model, column in RELATIONS}
+    fields = set()
+    for data in changes:
+        recipe = recipes[data['id']]
+        for field, value in data.items():
+            if field != 'id' and field not in relations:
+                setattr(recipe, field, value)
+                fields.add(field)
+    if fields:
+        Recipe.objects.bulk_update(
+            [recipes[data['id']] for data in changes],
+            sorted(fields),
+            batch_size=500
+        )
+    for name, model, column in RELATIONS:
+        wanted = {
+            data['id']: set(data[name]) for data in changes if name in data
+        }
+        if wanted:
+            added, removed = diff_relation(
+                getattr(Recipe, name).through, column, wanted
+            )
+            similarity.pairs_changed(user.pk, model, added, removed)
+
+    ids = [data['id'] for data in changes]
+    # bulk_update and the through table writes send no signals
+    changelog.record(user.pk, Change.KIND_RECIPE, ids, Change.OP_UPSERT)
+    stats.mark_stale(user.pk)
+    updated = Recipe.objects.filter(id__in=ids) \
+        .prefetch_related('tags', 'ingredients') \
+        .in_bulk()
+
+    return [updated[pk] for pk in ids]
@@ -0,0 +1,111 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipePagination(PageNumberPagination):
+    """Page numbers with a page size the client may lower or raise"""
+    page_size_query_param = 'page_size'
+
+    @property
+    def page_size(self):
+        return settings.RECIPE_PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.RECIPE_MAX_PAGE_SIZE
+
+
+class KeysetPagination(BasePagination):
+    """Forward only pages that continue after the last row seen
+
+    The cursor holds the ordering values of the last row of a page, the
+    next page is read with a range condition on them instead of an
+    OFFSET, so it costs the same however deep the client pages. The
+    queryset ordering must end in a unique field such as the id, and is
+    kept in the cursor so one made for another ordering is rejected.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = list(queryset.query.order_by)
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode(cursor)))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.RECIPE_PAGE_SIZE
+
+        return max(1, min(size, settings.RECIPE_MAX_PAGE_SIZE))
+
+    def after(self, values):
+        """Return the condition for rows ordered after the given values"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        return condition
+
+    def decode(self, cursor):
+        """Return the ordering values of a cursor, typed as their fields"""
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            if data['ordering'] != self.ordering or \
+                    len(data['values']) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field.lstrip('-'))
+                .to_python(value)
+                for field, value in zip(self.ordering, data['values'])
+            ]
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(_('Invalid cursor.'))
+
+    def encode(self, row):
+        data = {
+            'ordering': self.ordering,
+            'values': [
+                getattr(row, field.lstrip('-')) for field in self.ordering
+            ],
+        }
+
+        return urlsafe_b64encode(
+            json.dumps(data, default=str).encode()
+        ).decode()
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.has_next:
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode(self.last)
+            )
+
+        return Response({'next': next_url, 'results': data})
@@ -0,0 +1,73 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+
+from core import jobs
+from core.models import Job, Recipe
+
+
+def image_names(name):
+    """Return the stored image and the variants rendered from it"""
+    root = os.path.splitext(name)[0]
+
+    return [name] + [
+        f'{root}_{variant}.jpg' for variant in settings.RECIPE_IMAGE_VARIANTS
+    ]
+
+
+def delete_batch(queryset, batch_size):
+    """Delete up to `batch_size` rows of a queryset, return how many
+
+    Each batch is deleted in a transaction of its own so no lock is held
+    for longer than one batch takes. Recipes take their tag and
+    ingredient links along, their image files are removed once the rows
+    are gone.
+    """
+    model = queryset.model
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True)
+               [:batch_size])
+    if not ids:
+        return 0
+
+    images = []
+    if model is Recipe:
+        images = [
+            name for name in Recipe.all_objects.filter(id__in=ids)
+            .values_list('image', flat=True) if name
+        ]
+    with transaction.atomic(using=router.db_for_write(model)):
+        model._base_manager.filter(pk__in=ids).delete()
+    for name in images:
+        for path in image_names(name):
+            default_storage.delete(path)
+
+    return len(ids)
+
+
+def delete_all(queryset, batch_size=None):
+    """Delete every row of a queryset batch by batch, return how many"""
+    batch_size = batch_size or settings.RECIPE_PURGE_BATCH_SIZE
+    total = 0
+    while True:
+        deleted = delete_batch(queryset, batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def schedule(user):
+    """Queue the purge of the deleted recipes of a user
+
+    Deletes made before the queued job runs are purged by that job, so a
+    burst of deletes costs one job.
+    """
+    queued = Job.objects.filter(
+        task='recipe.purge_deleted',
+        user=user,
+        status=Job.STATUS_QUEUED
+    )
+    if not queued.exists():
+        jobs.enqueue('recipe.purge_deleted', user=user,
+                     delay=settings.RECIPE_PURGE_DELAY, user_id=user.pk)
@@ -0,0 +1,57 @@
+from core.models import Recipe
+from recipe import similarity
+
+
+def diff_relation(through, column, wanted):
+    """Bring the through rows of recipes in line with the wanted ids
+
+    `wanted` maps recipe ids to the full set of related ids each should
+    end up with. The current rows are read in one query and only the
+    difference is written, with one bulk insert and one delete. Returns
+    the added and removed (recipe id, related id) pairs.
+    """
+    current = {
+        (recipe_id, related_id): pk
+        for pk, recipe_id, related_id in through.objects
+        .filter(recipe_id__in=list(wanted))
+        .values_list('id', 'recipe_id', column)
+    }
+    target = {
+        (recipe_id, related_id)
+        for recipe_id, related_ids in wanted.items()
+        for related_id in related_ids
+    }
+    added = target - current.keys()
+    removed = current.keys() - target
+    through.objects.bulk_create(
+        [
+            through(recipe_id=recipe_id, **{column: related_id})
+            for recipe_id, related_id in sorted(added)
+        ],
+        batch_size=1000
+    )
+    if removed:
+        through.objects.filter(
+            id__in=[current[pair] for pair in removed]
+        ).delete()
+
+    return added, removed
+
+
+def set_related(recipe, name, related):
+    """Replace the tags or ingredients of a recipe by diffing its rows
+
+    Unlike `set()` the number of queries does not depend on how many
+    objects are added or removed. No m2m_changed signals are sent, the
+    recipe is logged as changed when it is saved.
+    """
+    field = Recipe._meta.get_field(name)
+    through = field.remote_field.through
+    column = through._meta.get_field(field.m2m_reverse_field_name()).attname
+    added, removed = diff_relation(
+        through, column, {recipe.pk: {obj.pk for obj in related}}
+    )
+    similarity.pairs_changed(
+        recipe.user_id, field.related_model, added, removed
+    )
+    getattr(recipe, '_prefetched_objects_cache', {}).pop(name, None)
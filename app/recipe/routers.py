@@ -0,0 +1,15 @@
+from rest_framework.routers import DefaultRouter
+
+
+class BulkRouter(DefaultRouter):
+    """Router that also maps PUT and PATCH on list routes to bulk updates
+
+    Viewsets without `bulk_update` or `bulk_partial_update` methods are
+    routed as before.
+    """
+    routes = list(DefaultRouter.routes)
+    routes[0] = routes[0]._replace(mapping={
+        **routes[0].mapping,
+        'put': 'bulk_update',
+        'patch': 'bulk_partial_update',
+    })
@@ -1,6 +1,23 @@
+import json
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from core.models import Tag, Ingredient, Recipe, Job, RecipeStats
+
+from recipe import relations, uploads
+
 
-from core.models import Tag, Ingredient, Recipe
+# File extension used for each image type accepted by direct uploads
+IMAGE_CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -21,13 +38,53 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Look up all primary keys of a many relation in one query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pks = []
+        for item in data:
+            try:
+                pk = int(item)
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            if pk not in pks:
+                pks.append(pk)
+        found = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=pk)
+
+        return [found[pk] for pk in pks]
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key relation validated with one query when `many=True`"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        list_kwargs.update({
+            key: value for key, value in kwargs.items()
+            if key in MANY_RELATION_KWARGS
+        })
+
+        return BatchedManyRelatedField(**list_kwargs)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipe objects"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = BatchedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BatchedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -38,6 +95,35 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'price', 'link', 'image')
         read_only_fields = ('id', 'image')
 
+    def update(self, instance, validated_data):
+        """Update a recipe, writing only changed tags and ingredients"""
+        related = {
+            name: validated_data.pop(name)
+            for name in ('tags', 'ingredients')
+            if name in validated_data
+        }
+        instance = super().update(instance, validated_data)
+        for name, objs in related.items():
+            relations.set_related(instance, name, objs)
+
+        return instance
+
+
+class RecipeBulkItemSerializer(serializers.ModelSerializer):
+    """Validate one item of a bulk recipe update without queries"""
+    id = serializers.IntegerField()
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1)
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1)
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'link')
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
@@ -45,10 +131,176 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class SniffedImageField(serializers.ImageField):
+    """Image field that trusts the checks made by the upload handler
+
+    Files streamed through `RecipeImageUploadHandler` were already
+    identified from their header, so Pillow does not have to decode them
+    again here.
+    """
+
+    def to_internal_value(self, data):
+        if getattr(data, 'image_format', None):
+            return serializers.FileField.to_internal_value(self, data)
+
+        return super().to_internal_value(data)
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Serializer for the ids requested in a batch read"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+    def validate_ids(self, value):
+        """Drop repeated ids and enforce the batch size limit"""
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.RECIPE_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                _('Request at most %d recipes at once.')
+                % settings.RECIPE_BATCH_MAX_IDS
+            )
+
+        return ids
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Serializer for the range filters and ordering of a recipe list"""
+    ORDERINGS = ('id', 'title', 'price', 'time_minutes')
+
+    time_minutes__gte = serializers.IntegerField(required=False)
+    time_minutes__lte = serializers.IntegerField(required=False)
+    price__gte = serializers.DecimalField(max_digits=5, decimal_places=2,
+                                          required=False)
+    price__lte = serializers.DecimalField(max_digits=5, decimal_places=2,
+                                          required=False)
+    ordering = serializers.ChoiceField(
+        choices=ORDERINGS + tuple(f'-{field}' for field in ORDERINGS),
+        default='-id'
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    """Serializer for the ingredients in a pantry match"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_ingredients(self, value):
+        """Drop repeated ids and enforce the pantry size limit"""
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.RECIPE_PANTRY_MAX_INGREDIENTS:
+            raise serializers.ValidationError(
+                _('Give at most %d ingredients.')
+                % settings.RECIPE_PANTRY_MAX_INGREDIENTS
+            )
+
+        return ids
+
+
+class RecipePantrySerializer(RecipeSerializer):
+    """Serialize a recipe with how well a pantry covers it"""
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('matched', 'missing')
+
+
+class RecipeSimilarQuerySerializer(serializers.Serializer):
+    """Serializer for the query params of a similar recipes request"""
+    limit = serializers.IntegerField(min_value=1, default=10)
+
+    def validate_limit(self, value):
+        """Enforce the most similar recipes returned at once"""
+        if value > settings.RECIPE_SIMILAR_MAX_LIMIT:
+            raise serializers.ValidationError(
+                _('Request at most %d recipes at once.')
+                % settings.RECIPE_SIMILAR_MAX_LIMIT
+            )
+
+        return value
+
+
+class RecipeSimilarSerializer(RecipeSerializer):
+    """Serialize a recipe with its similarity to another one"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('similarity',)
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    image = SniffedImageField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class RecipeImageUploadUrlSerializer(serializers.Serializer):
+    """Serializer for requesting a direct-to-storage image upload"""
+    content_type = serializers.ChoiceField(choices=list(IMAGE_CONTENT_TYPES))
+
+
+class RecipeImageConfirmSerializer(serializers.Serializer):
+    """Serializer for recording an image uploaded straight to storage"""
+    upload_token = serializers.CharField()
+
+    def validate_upload_token(self, value):
+        """Return the storage key the token was issued for"""
+        name = uploads.read_upload_token(value, self.instance)
+        if name is None:
+            raise serializers.ValidationError(
+                _('Invalid or expired upload token.')
+            )
+
+        return name
+
+    def update(self, instance, validated_data):
+        """Point the recipe image at the uploaded object"""
+        instance.image.name = validated_data['upload_token']
+        instance.save(update_fields=['image'])
+
+        return instance
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    """Serializer for the stored summary of a user's recipes"""
+    stale = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeStats
+        fields = ('refreshed_at', 'stale')
+        read_only_fields = fields
+
+    def get_stale(self, obj):
+        return obj.stale_since is not None
+
+    def to_representation(self, instance):
+        return dict(json.loads(instance.data),
+                    **super().to_representation(instance))
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background job status"""
+    result = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'task', 'status', 'attempts', 'result', 'error',
+                  'created_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_result(self, obj):
+        return json.loads(obj.result) if obj.result else None
+
+    def get_error(self, obj):
+        lines = obj.last_error.strip().splitlines()
+        return lines[-1] if lines else None
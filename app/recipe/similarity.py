@@ -0,0 +1,300 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from core.models import Tag, Ingredient, Recipe
+from core.startup import lazy_import
+
+
+# Loaded when the first index is built, not when workers start
+np = lazy_import('numpy')
+
+
+# Features of a recipe are encoded as one integer: 2 * id + kind
+FEATURE_KINDS = {Ingredient: 0, Tag: 1}
+
+_indexes = OrderedDict()
+_lock = threading.RLock()
+
+
+def encode(model, ids):
+    """Return the feature codes of tag or ingredient ids"""
+    return np.asarray(list(ids), dtype=np.int64) * 2 + FEATURE_KINDS[model]
+
+
+class SimilarityIndex:
+    """Sparse recipe by feature incidence matrix of one user's library
+
+    Nonzero entries are kept as two parallel arrays (recipe row, feature
+    code). Scoring one recipe against the library is a handful of
+    vectorized passes over them, with no queries.
+    """
+
+    def __init__(self, recipe_ids, rows, cols):
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        self.row_of = {pk: row for row, pk in enumerate(recipe_ids)}
+        self.alive = np.ones(len(recipe_ids), dtype=bool)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.sizes = np.bincount(self.rows, minlength=len(recipe_ids))
+
+    @classmethod
+    def build(cls, user_id):
+        """Load the index of a user from the through tables"""
+        recipe_ids = np.array(
+            Recipe.objects.filter(user_id=user_id)
+            .order_by('id').values_list('id', flat=True),
+            dtype=np.int64
+        )
+        rows, cols = [], []
+        # The links are read after the ids, drop those of recipes added
+        # in between; their commit makes this index stale anyway
+        for model, name in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+            through = getattr(Recipe, name).through
+            column = f'{model._meta.model_name}_id'
+            pairs = np.array(
+                through.objects.filter(recipe__user_id=user_id,
+                                       recipe__deleted_at__isnull=True)
+                .values_list('recipe_id', column),
+                dtype=np.int64
+            ).reshape(-1, 2)
+            pairs = pairs[np.isin(pairs[:, 0], recipe_ids)]
+            rows.append(np.searchsorted(recipe_ids, pairs[:, 0]))
+            cols.append(pairs[:, 1] * 2 + FEATURE_KINDS[model])
+
+        return cls(recipe_ids, np.concatenate(rows), np.concatenate(cols))
+
+    def _keys(self, rows, cols):
+        return rows * 2 ** 33 + cols
+
+    def _rows(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            self.add_recipe(recipe_id)
+        return np.array(
+            [self.row_of[pk] for pk in recipe_ids],
+            dtype=np.int64
+        )
+
+    def add_recipe(self, recipe_id):
+        if recipe_id in self.row_of:
+            return
+        self.row_of[recipe_id] = len(self.recipe_ids)
+        self.recipe_ids = np.append(self.recipe_ids, recipe_id)
+        self.alive = np.append(self.alive, True)
+        self.sizes = np.append(self.sizes, 0)
+
+    def remove_recipe(self, recipe_id):
+        row = self.row_of.pop(recipe_id, None)
+        if row is None:
+            return
+        self._drop(self.rows == row)
+        self.alive[row] = False
+
+    def add_pairs(self, recipe_ids, codes):
+        """Link features to recipes, given as two parallel sequences"""
+        rows = self._rows(recipe_ids)
+        keys = np.unique(self._keys(rows, np.asarray(codes, np.int64)))
+        keys = keys[~np.isin(keys, self._keys(self.rows, self.cols))]
+        rows, cols = np.divmod(keys, 2 ** 33)
+        self.rows = np.append(self.rows, rows)
+        self.cols = np.append(self.cols, cols)
+        np.add.at(self.sizes, rows, 1)
+
+    def remove_pairs(self, recipe_ids, codes):
+        """Unlink features from recipes, given as two parallel sequences"""
+        known = [pk in self.row_of for pk in recipe_ids]
+        recipe_ids = [pk for pk, ok in zip(recipe_ids, known) if ok]
+        codes = np.asarray(codes, np.int64)[np.array(known, dtype=bool)]
+        keys = self._keys(self._rows(recipe_ids), codes)
+        self._drop(np.isin(self._keys(self.rows, self.cols), keys))
+
+    def remove_features(self, codes):
+        """Unlink features from all recipes"""
+        self._drop(np.isin(self.cols, codes))
+
+    def clear_kind(self, recipe_id, model):
+        """Remove all tags or all ingredients of a recipe"""
+        row = self.row_of.get(recipe_id)
+        if row is not None:
+            self._drop(
+                (self.rows == row) & (self.cols % 2 == FEATURE_KINDS[model])
+            )
+
+    def _drop(self, mask):
+        np.subtract.at(self.sizes, self.rows[mask], 1)
+        self.rows = self.rows[~mask]
+        self.cols = self.cols[~mask]
+
+    def similar(self, recipe_id, limit):
+        """Return (recipe id, Jaccard similarity) of the closest recipes"""
+        row = self.row_of.get(recipe_id)
+        if row is None:
+            return []
+        features = self.cols[self.rows == row]
+        if not len(features):
+            return []
+        shared = np.bincount(
+            self.rows[np.isin(self.cols, features)],
+            minlength=len(self.recipe_ids)
+        )
+        scores = shared / (self.sizes + len(features) - shared)
+        scores[row] = 0
+        scores[~self.alive] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[
+                np.argpartition(-scores[candidates], limit - 1)[:limit]
+            ]
+        candidates = candidates[
+            np.lexsort((self.recipe_ids[candidates], -scores[candidates]))
+        ]
+
+        return [
+            (int(self.recipe_ids[row]), float(scores[row]))
+            for row in candidates
+        ]
+
+
+def _version_key(user_id):
+    return f'recipe.similarity:{user_id}'
+
+
+def get_index(user_id):
+    """Return the up to date index of a user, building it if needed
+
+    Indexes older than RECIPE_SIMILARITY_MAX_AGE are rebuilt even when
+    no change was seen, which bounds how stale they get when the cache
+    holding the versions is not shared by all workers.
+    """
+    version = cache.get_or_set(_version_key(user_id), 0, None)
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == version and \
+                time.monotonic() - cached[2] < \
+                settings.RECIPE_SIMILARITY_MAX_AGE:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+
+    index = SimilarityIndex.build(user_id)
+    with _lock:
+        _indexes[user_id] = (version, index, time.monotonic())
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.RECIPE_SIMILARITY_MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def invalidate(user_id):
+    """Make every process rebuild the index of a user on next use"""
+    _bump(user_id)
+    with _lock:
+        _indexes.pop(user_id, None)
+
+
+def _bump(user_id):
+    key = _version_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+        return 1
+
+
+def _update(user_id, change, using=None):
+    """Apply a change to the index of this process, stale others
+
+    Both happen once the change is committed, so a rolled back change
+    is never applied.
+    """
+    using = using or router.db_for_write(Recipe)
+    transaction.on_commit(lambda: _apply(user_id, change), using=using)
+
+
+def _apply(user_id, change):
+    version = _bump(user_id)
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached is None:
+            return
+        if cached[0] != version - 1:
+            # Missed a change made elsewhere, rebuild on next use
+            del _indexes[user_id]
+            return
+        change(cached[1])
+        _indexes[user_id] = (version, cached[1], cached[2])
+
+
+def recipe_saved(sender, instance, created, using, **kwargs):
+    if instance.deleted_at is not None:
+        recipe_deleted(sender, instance, using)
+    elif created:
+        _update(instance.user_id,
+                lambda index: index.add_recipe(instance.pk), using)
+
+
+def recipe_deleted(sender, instance, using, **kwargs):
+    _update(instance.user_id,
+            lambda index: index.remove_recipe(instance.pk), using)
+
+
+def feature_deleted(sender, instance, using, **kwargs):
+    def change(index):
+        index.remove_features(encode(sender, [instance.pk]))
+
+    _update(instance.user_id, change, using)
+
+
+def relinked(sender, instance, action, reverse, model, pk_set, using,
+             **kwargs):
+    """Apply tags or ingredients added to or removed from recipes"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        if reverse:
+            feature_deleted(type(instance), instance, using)
+        else:
+            _update(instance.user_id,
+                    lambda index: index.clear_kind(instance.pk, model),
+                    using)
+        return
+
+    if reverse:
+        feature_model, pairs = type(instance), [
+            (recipe_id, instance.pk) for recipe_id in pk_set
+        ]
+    else:
+        feature_model, pairs = model, [
+            (instance.pk, related_id) for related_id in pk_set
+        ]
+    added = pairs if action == 'post_add' else ()
+    removed = pairs if action == 'post_remove' else ()
+    pairs_changed(instance.user_id, feature_model, added, removed, using)
+
+
+def pairs_changed(user_id, model, added=(), removed=(), using=None):
+    """Apply (recipe id, tag or ingredient id) links added or removed"""
+    def change(index):
+        for pairs, apply in ((removed, index.remove_pairs),
+                             (added, index.add_pairs)):
+            if pairs:
+                recipe_ids, related_ids = zip(*pairs)
+                apply(list(recipe_ids), encode(model, related_ids))
+
+    if added or removed:
+        _update(user_id, change, using)
+
+
+def connect():
+    """Keep the indexes of this process in step with recipe changes"""
+    post_save.connect(recipe_saved, sender=Recipe)
+    post_delete.connect(recipe_deleted, sender=Recipe)
+    for model in (Tag, Ingredient):
+        post_delete.connect(feature_deleted, sender=model)
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(relinked, sender=through)
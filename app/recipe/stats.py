@@ -0,0 +1,157 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, router
+from django.db.models import Aggregate, Avg, Count, FloatField, Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.utils import timezone
+
+from core import changelog, jobs
+from core.models import Tag, Ingredient, Recipe, RecipeStats
+
+
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL percentile_cont over a fixed list of fractions
+
+    Returns one value per fraction, as an array.
+    """
+    function = 'percentile_cont'
+    template = '%(function)s(ARRAY%(fractions)s) ' \
+               'WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = ArrayField(FloatField())
+
+    def __init__(self, expression, fractions, **extra):
+        super().__init__(
+            expression,
+            fractions=repr([float(f) for f in fractions]),
+            **extra
+        )
+
+
+def percentile(values, fraction):
+    """Interpolate a percentile of sorted values like percentile_cont"""
+    position = (len(values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def price_percentiles(recipes):
+    """Return the price percentiles of recipes, keyed by fraction"""
+    if connections[recipes.db].vendor == 'postgresql':
+        values = recipes.aggregate(
+            prices=PercentileCont('price', PERCENTILES)
+        )['prices'] or []
+    else:
+        prices = [
+            float(price) for price in
+            recipes.order_by('price').values_list('price', flat=True)
+        ]
+        values = [
+            percentile(prices, fraction) for fraction in PERCENTILES
+        ] if prices else []
+
+    return {
+        f'p{int(fraction * 100)}': round(value, 2)
+        for fraction, value in zip(PERCENTILES, values)
+    }
+
+
+def top(model, user_id):
+    """Return the tags or ingredients used by most recipes of a user"""
+    return list(
+        model.objects.filter(user_id=user_id)
+        .annotate(recipes=Count(
+            'recipe', filter=Q(recipe__deleted_at__isnull=True)
+        ))
+        .filter(recipes__gt=0)
+        .order_by('-recipes', 'name')
+        .values('id', 'name', 'recipes')[:settings.RECIPE_STATS_TOP]
+    )
+
+
+def compute(user_id):
+    """Compute the summary of a user's recipes"""
+    recipes = Recipe.objects.filter(user_id=user_id)
+    totals = recipes.aggregate(
+        recipe_count=Count('id'),
+        avg_time_minutes=Avg('time_minutes')
+    )
+    if totals['avg_time_minutes'] is not None:
+        totals['avg_time_minutes'] = round(totals['avg_time_minutes'], 1)
+
+    return dict(
+        totals,
+        price_percentiles=price_percentiles(recipes),
+        top_tags=top(Tag, user_id),
+        top_ingredients=top(Ingredient, user_id),
+    )
+
+
+def refresh(user_id):
+    """Recompute and store the summary of a user, return it
+
+    The stale mark is cleared before computing, so changes made while
+    the summary is computed mark it stale again and queue a new refresh.
+    """
+    RecipeStats.objects.filter(user_id=user_id).update(stale_since=None)
+    refreshed_at = timezone.now()
+    data = json.dumps(compute(user_id))
+    summary, created = RecipeStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={'data': data, 'refreshed_at': refreshed_at}
+    )
+
+    return summary
+
+
+def mark_stale(user_id, using=None):
+    """Flag the summary of a user as stale and queue its refresh
+
+    Only the first change after a refresh queues a job, later ones are
+    picked up by that same job. Users who never asked for their stats
+    have no summary and cost nothing here.
+    """
+    if changelog.is_deleting(user_id):
+        return
+    using = using or router.db_for_write(RecipeStats)
+    marked = RecipeStats.objects.using(using) \
+        .filter(user_id=user_id, stale_since__isnull=True) \
+        .update(stale_since=timezone.now())
+    if marked:
+        jobs.enqueue(
+            'recipe.refresh_stats',
+            user=get_user_model().objects.get(pk=user_id),
+            delay=settings.RECIPE_STATS_REFRESH_DELAY,
+            user_id=user_id
+        )
+
+
+def changed(sender, instance, using, **kwargs):
+    mark_stale(instance.user_id, using)
+
+
+def deleted(sender, instance, using, **kwargs):
+    # Purging a soft deleted recipe does not change the summary
+    if getattr(instance, 'deleted_at', None) is None:
+        mark_stale(instance.user_id, using)
+
+
+def relinked(sender, instance, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        mark_stale(instance.user_id, using)
+
+
+def connect():
+    """Mark summaries stale when the recipes they describe change"""
+    for model in (Tag, Ingredient, Recipe):
+        post_save.connect(changed, sender=model)
+        post_delete.connect(deleted, sender=model)
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(relinked, sender=through)
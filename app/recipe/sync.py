@@ -0,0 +1,106 @@
+from django.conf import settings
+
+from core.changelog import running_transactions
+from core.models import Tag, Ingredient, Recipe, Change
+from core.sharding import shard_for_user
+
+from recipe import serializers
+
+
+SECTIONS = (
+    (Change.KIND_TAG, 'tags', Tag, serializers.TagSerializer),
+    (Change.KIND_INGREDIENT, 'ingredients', Ingredient,
+     serializers.IngredientSerializer),
+    (Change.KIND_RECIPE, 'recipes', Recipe, serializers.RecipeSerializer),
+)
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def make_token(shard, seq):
+    return f'{shard}.{seq}'
+
+
+def parse_token(token, shard):
+    """Return the change sequence a token points at for the given shard
+
+    Tokens from another shard (the user's data was moved) start over from
+    the beginning, which is reported as a reset.
+    """
+    if not token:
+        return 0, False
+    token_shard, _, seq = token.rpartition('.')
+    try:
+        seq = int(seq)
+    except ValueError:
+        raise InvalidToken(token)
+    if token_shard != shard:
+        return 0, True
+
+    return seq, False
+
+
+def held_back(changes, oldest, current):
+    """Return how many leading changes are safe to hand out
+
+    Ids are taken when a change is written but become visible when its
+    transaction commits, so a change may show up before one with a lower
+    id. Entries of transactions that were not finished when the log was
+    read end the page, the client gets them on a later sync along with
+    anything committed before them.
+    """
+    if oldest is None:
+        return len(changes)
+    for position, change in enumerate(changes):
+        if change.txid is not None and change.txid >= oldest and \
+                change.txid != current:
+            return position
+
+    return len(changes)
+
+
+def changes_since(user, token):
+    """Return one page of objects changed after the given sync token"""
+    shard = shard_for_user(user)
+    since, reset = parse_token(token, shard)
+    page_size = settings.SYNC_PAGE_SIZE
+    log = Change.objects.filter(user=user, id__gt=since).order_by('id')
+    # Taken before the log is read, anything committed in between counts
+    # as still running
+    oldest, current = running_transactions(log.db)
+    changes = list(log[:page_size + 1])
+    safe = held_back(changes, oldest, current)
+    has_more = safe > page_size
+    changes = changes[:min(safe, page_size)]
+
+    result = {
+        'token': make_token(shard, changes[-1].id if changes else since),
+        'has_more': has_more,
+        'reset': reset,
+    }
+    for kind, section, model, serializer_class in SECTIONS:
+        upserted = [
+            c.object_id for c in changes
+            if c.kind == kind and c.op == Change.OP_UPSERT
+        ]
+        deleted = [
+            c.object_id for c in changes
+            if c.kind == kind and c.op == Change.OP_DELETE
+        ]
+        objects = []
+        if upserted:
+            objects = model.objects.filter(user=user, id__in=upserted) \
+                .order_by('id')
+            if model is Recipe:
+                objects = objects.prefetch_related('tags', 'ingredients')
+        data = serializer_class(objects, many=True).data
+        found = {item['id'] for item in data}
+        result[section] = {
+            'updated': data,
+            # Deleted after the change log was read
+            'deleted': deleted + [i for i in upserted if i not in found],
+        }
+
+    return result
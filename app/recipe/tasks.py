@@ -0,0 +1,80 @@
+import json
+import os
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from core.jobs import task
+from core.models import Recipe
+
+from recipe import purge, serializers, stats
+
+
+@task('recipe.image_variants')
+def generate_image_variants(recipe_id):
+    """Render the resized copies of a recipe image
+
+    Variants are named after the image, a run for an image rendered
+    before replaces its files rather than adding suffixed copies.
+    """
+    from PIL import Image
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return {}
+
+    with recipe.image.open('rb') as image_file:
+        original = Image.open(image_file)
+        original.load()
+    original = original.convert('RGB')
+
+    root = os.path.splitext(recipe.image.name)[0]
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size))
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        # Rendered again in place, purge.image_names finds it by name
+        name = f'{root}_{variant}.jpg'
+        default_storage.delete(name)
+        variants[variant] = default_storage.save(
+            name,
+            ContentFile(buffer.getvalue())
+        )
+
+    return variants
+
+
+@task('recipe.export')
+def export_recipes(user_id):
+    """Write all recipes of a user to a JSON file in media storage"""
+    recipes = Recipe.objects.filter(user_id=user_id) \
+        .prefetch_related('tags', 'ingredients').order_by('id')
+    data = serializers.RecipeDetailSerializer(recipes, many=True).data
+    name = default_storage.save(
+        f'exports/{uuid.uuid4()}.json',
+        ContentFile(json.dumps(data, default=str).encode())
+    )
+
+    return {'file': name, 'url': default_storage.url(name)}
+
+
+@task('recipe.refresh_stats')
+def refresh_stats(user_id):
+    """Recompute the recipe summary of a user"""
+    stats.refresh(user_id)
+
+    return {}
+
+
+@task('recipe.purge_deleted')
+def purge_deleted(user_id):
+    """Delete the soft deleted recipes of a user for good"""
+    deleted = Recipe.all_objects.filter(user_id=user_id,
+                                        deleted_at__isnull=False)
+
+    return {'purged': purge.delete_all(deleted)}
@@ -0,0 +1,155 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Change
+from core.tests.factories import sample_user, sample_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PrivateBulkRecipeApiTests(TestCase):
+    """Test updating many recipes in one request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_partial_update(self):
+        """Test changing fields and tags of many recipes at once"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        recipe1 = sample_recipe(user=self.user, title='Salad')
+        recipe1.tags.add(vegan)
+        recipe2 = sample_recipe(user=self.user, title='Soup')
+        payload = [
+            {'id': recipe1.id, 'price': '7.50', 'tags': [quick.id]},
+            {'id': recipe2.id, 'title': 'Tomato soup'},
+        ]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [recipe1.id, recipe2.id])
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.price, Decimal('7.50'))
+        self.assertEqual(list(recipe1.tags.all()), [quick])
+        self.assertEqual(recipe2.title, 'Tomato soup')
+        self.assertEqual(recipe2.price, Decimal('5.50'))
+
+    def test_bulk_update_requires_all_fields(self):
+        """Test that a bulk PUT rejects items missing fields"""
+        recipe = sample_recipe(user=self.user)
+        payload = [{'id': recipe.id, 'title': 'Soup'}]
+        res = self.client.put(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price', res.data['errors'][0])
+
+    def test_bulk_update_reports_errors_per_item(self):
+        """Test that one invalid item rejects the whole batch"""
+        recipe = sample_recipe(user=self.user)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password'
+        )
+        other_recipe = sample_recipe(user=other)
+        other_tag = Tag.objects.create(user=other, name='Private')
+        payload = [
+            {'id': recipe.id, 'price': '1.00'},
+            {'id': other_recipe.id, 'price': '1.00'},
+            {'id': recipe.id, 'title': 'Again'},
+            {'id': recipe.id, 'tags': [other_tag.id]},
+            {'price': '1.00'},
+        ]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = res.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('id', errors[1])
+        self.assertIn('id', errors[2])
+        self.assertIn('id', errors[3])
+        self.assertIn('id', errors[4])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.price, Decimal('5.50'))
+
+    def test_bulk_update_unknown_tag(self):
+        """Test that tags of other users are rejected"""
+        recipe = sample_recipe(user=self.user)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password'
+        )
+        tag = Tag.objects.create(user=other, name='Private')
+        payload = [{'id': recipe.id, 'tags': [tag.id]}]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data['errors'][0])
+        self.assertFalse(recipe.tags.exists())
+
+    def test_bulk_update_expects_list(self):
+        """Test that a bulk update body must be a list"""
+        res = self.client.patch(RECIPES_URL, {'id': 1}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_BULK_UPDATE_MAX=1)
+    def test_bulk_update_limit(self):
+        """Test that a bulk update is limited in size"""
+        recipes = [sample_recipe(user=self.user) for _ in range(2)]
+        payload = [{'id': recipe.id, 'price': '1.00'} for recipe in recipes]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_logs_changes(self):
+        """Test that recipes changed in bulk show up in the change log"""
+        recipe = sample_recipe(user=self.user)
+        Change.objects.all().delete()
+        payload = [{'id': recipe.id, 'price': '2.00'}]
+        self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertTrue(Change.objects.filter(
+            kind=Change.KIND_RECIPE,
+            object_id=recipe.id,
+            op=Change.OP_UPSERT
+        ).exists())
+
+    def test_bulk_update_fixed_query_count(self):
+        """Test that the number of queries does not grow with the batch"""
+        tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(10)
+        ]
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+
+        def run(count):
+            payload = [
+                {
+                    'id': sample_recipe(user=self.user).id,
+                    'price': '3.00',
+                    'tags': [tag.id for tag in tags[:count]],
+                    'ingredients': [ingredient.id],
+                }
+                for _ in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(run(2), run(10))
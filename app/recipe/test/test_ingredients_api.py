@@ -7,6 +7,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
+from core.tests.factories import sample_user
 
 from recipe.serializers import IngredientSerializer
 
@@ -30,11 +31,11 @@ class PublicIngredientsApiTests(TestCase):
 class PrivateIngredientsApiTests(TestCase):
     """Test the authorized user ingredients API"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
     def setUp(self):
-        self.user = get_user_model().objects.create_user(
-            'test@example.com',
-            'password'
-        )
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -82,6 +83,23 @@ class PrivateIngredientsApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_ingredients_bulk(self):
+        """Test creating many ingredients reuses the existing ones"""
+        existing = Ingredient.objects.create(user=self.user, name='Salt')
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password'
+        )
+        Ingredient.objects.create(user=other, name='Pepper')
+        payload = [{'name': 'salt'}, {'name': 'Pepper'}]
+        res = self.client.post(INGREDIENTS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]['id'], existing.id)
+        self.assertTrue(
+            Ingredient.objects.filter(user=self.user, name='Pepper').exists()
+        )
+
     def test_retrieve_ingredients_assigned_to_recipes(self):
         """Test filtering ingredients by those assigned to recipes"""
         ingredient1 = Ingredient.objects.create(user=self.user, name='Apple')
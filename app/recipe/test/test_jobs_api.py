@@ -0,0 +1,81 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Job, Recipe
+from core.tests.factories import sample_user
+
+
+JOBS_URL = reverse('recipe:job-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def detail_url(job_id):
+    """Return job detail URL"""
+    return reverse('recipe:job-detail', args=[job_id])
+
+
+class PublicJobsApiTests(TestCase):
+    """Test the publicly available jobs API"""
+
+    def test_login_required(self):
+        """Test that login is required to access job status"""
+        res = APIClient().get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateJobsApiTests(TestCase):
+    """Test the authorized user jobs API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_jobs_limited_to_user(self):
+        """Test that only the user's own jobs are visible"""
+        user2 = get_user_model().objects.create_user(
+            'new@example.com',
+            'password'
+        )
+        jobs.enqueue('recipe.export', user=user2, user_id=user2.id)
+        job = jobs.enqueue('recipe.export', user=self.user,
+                           user_id=self.user.id)
+
+        res = self.client.get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], job.id)
+        self.assertEqual(res.data[0]['status'], Job.STATUS_QUEUED)
+
+    def test_export_recipes_accepted(self):
+        """Test that an export is queued and its result reported"""
+        Recipe.objects.create(user=self.user, title='Toast',
+                              time_minutes=3, price=1)
+
+        res = self.client.post(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(res['Location'].endswith(detail_url(res.data['id'])))
+
+        jobs.run_pending()
+        res = self.client.get(detail_url(res.data['id']))
+        export_name = res.data['result']['file']
+        with default_storage.open(export_name) as export_file:
+            exported = json.load(export_file)
+        default_storage.delete(export_name)
+
+        self.assertEqual(res.data['status'], Job.STATUS_SUCCEEDED)
+        self.assertEqual([r['title'] for r in exported], ['Toast'])
@@ -0,0 +1,102 @@
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient
+from core.tests.factories import sample_user, sample_recipe
+
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+class PrivatePantryApiTests(TestCase):
+    """Test matching recipes against a pantry"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+        cls.salt, cls.kale, cls.rice, cls.eggs = [
+            Ingredient.objects.create(user=cls.user, name=name)
+            for name in ('Salt', 'Kale', 'Rice', 'Eggs')
+        ]
+        cls.fried_rice = sample_recipe(user=cls.user, title='Fried rice')
+        cls.fried_rice.ingredients.add(cls.salt, cls.rice, cls.eggs)
+        cls.salad = sample_recipe(user=cls.user, title='Salad')
+        cls.salad.ingredients.add(cls.salt, cls.kale)
+        cls.omelette = sample_recipe(user=cls.user, title='Omelette')
+        cls.omelette.ingredients.add(cls.eggs)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pantry_ranks_by_missing_ingredients(self):
+        """Test that fully covered recipes come first"""
+        payload = {'ingredients': [self.salt.id, self.kale.id, self.rice.id]}
+        res = self.client.post(PANTRY_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        results = res.data['results']
+        self.assertEqual(
+            [(r['id'], r['matched'], r['missing']) for r in results],
+            [(self.salad.id, 2, 0), (self.fried_rice.id, 2, 1)]
+        )
+
+    def test_pantry_max_missing(self):
+        """Test leaving out recipes missing too many ingredients"""
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{self.salt.id},{self.eggs.id}',
+            'max_missing': 0,
+        })
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [self.omelette.id]
+        )
+
+    def test_pantry_paginated(self):
+        """Test that matches are split in pages"""
+        ids = [self.salt.id, self.kale.id, self.rice.id, self.eggs.id]
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': ','.join(map(str, ids)),
+            'page_size': 2,
+            'page': 2,
+        })
+
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [self.omelette.id]
+        )
+
+    def test_pantry_fixed_query_count(self):
+        """Test that matching does not query once per recipe"""
+        ids = [self.salt.id, self.kale.id, self.rice.id, self.eggs.id]
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(PANTRY_URL, {'ingredients': ids},
+                                   format='json')
+
+        self.assertEqual(len(res.data['results']), 3)
+        # Count, page of matches, then tags and ingredients
+        self.assertEqual(len(queries), 4)
+
+    def test_pantry_ignores_other_users(self):
+        """Test that recipes of other users are not matched"""
+        other = sample_user('other@example.com')
+        recipe = sample_recipe(user=other)
+        recipe.ingredients.add(self.salt)
+        res = self.client.post(PANTRY_URL, {'ingredients': [self.salt.id]},
+                               format='json')
+
+        self.assertNotIn(recipe.id, [r['id'] for r in res.data['results']])
+
+    def test_pantry_requires_ingredients(self):
+        """Test that an empty pantry is rejected"""
+        res = self.client.get(PANTRY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
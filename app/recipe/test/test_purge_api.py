@@ -0,0 +1,127 @@
+from io import BytesIO
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Recipe, Change, Job
+from core.tests.factories import sample_user, sample_recipe, sample_tag, \
+    sample_ingredient
+
+from recipe.tasks import generate_image_variants
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(RECIPE_PURGE_DELAY=0)
+class RecipeDeleteApiTests(TestCase):
+    """Test deleting recipes and purging them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_delete_recipe(self):
+        """Test that a deleted recipe is hidden but kept until purged"""
+        recipe = sample_recipe(user=self.user)
+        kept = sample_recipe(user=self.user)
+
+        res = self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([r['id'] for r in res.data], [kept.id])
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        recipe = Recipe.all_objects.get(id=recipe.id)
+        self.assertIsNotNone(recipe.deleted_at)
+        self.assertTrue(Change.objects.filter(
+            kind=Change.KIND_RECIPE, object_id=recipe.id,
+            op=Change.OP_DELETE
+        ).exists())
+
+    def test_deletes_share_purge_job(self):
+        """Test that deletes before the purge runs queue one job"""
+        for recipe in (sample_recipe(user=self.user),
+                       sample_recipe(user=self.user)):
+            self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(
+            Job.objects.filter(task='recipe.purge_deleted').count(), 1
+        )
+
+    @override_settings(RECIPE_PURGE_BATCH_SIZE=2)
+    def test_purge(self):
+        """Test purging rows, links and image files of deleted recipes"""
+        tag = sample_tag(user=self.user)
+        name = default_storage.save('uploads/recipe/purged.jpg',
+                                    ContentFile(b'image'))
+        variant = default_storage.save('uploads/recipe/purged_thumbnail.jpg',
+                                       ContentFile(b'image'))
+        deleted = [sample_recipe(user=self.user) for _ in range(3)]
+        deleted[0].tags.add(tag)
+        deleted[0].ingredients.add(sample_ingredient(user=self.user))
+        Recipe.objects.filter(id=deleted[0].id).update(image=name)
+        live = sample_recipe(user=self.user)
+        live.tags.add(tag)
+        for recipe in deleted:
+            self.client.delete(detail_url(recipe.id))
+        Change.objects.all().delete()
+
+        job, = jobs.run_pending()
+
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, '{"purged": 3}')
+        self.assertEqual(list(Recipe.all_objects.all()), [live])
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 0)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(variant))
+        # Deletes were logged when the recipes were deleted
+        self.assertFalse(Change.objects.exists())
+
+    def test_assigned_tags_skip_deleted_recipes(self):
+        """Test that tags only used by deleted recipes are not assigned"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data, [])
+
+    def test_purge_rendered_variants(self):
+        """Test that variants rendered more than once are purged"""
+        buffer = BytesIO()
+        Image.new('RGB', (300, 300)).save(buffer, format='JPEG')
+        name = default_storage.save('uploads/recipe/rendered.jpg',
+                                    ContentFile(buffer.getvalue()))
+        recipe = sample_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(image=name)
+        first = generate_image_variants(recipe.id)
+        second = generate_image_variants(recipe.id)
+
+        self.client.delete(detail_url(recipe.id))
+        jobs.run_pending()
+
+        self.assertEqual(first, second)
+        for stored in [name, *second.values()]:
+            self.assertFalse(default_storage.exists(stored))
@@ -1,22 +1,34 @@
+import json
 import tempfile
 import os
+from io import BytesIO
+from base64 import urlsafe_b64encode
 
 from PIL import Image
 
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.files.storage import default_storage
 from django.urls import reverse
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core import jobs
+from core.models import Recipe
+from core.tests.factories import sample_user, sample_tag, \
+    sample_ingredient, sample_recipe
 
+from recipe import uploads
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
 
 
 def image_upload_url(recipe_id):
@@ -24,33 +36,16 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def image_upload_url_url(recipe_id):
+    """Return URL for presigning a direct recipe image upload"""
+    return reverse('recipe:recipe-image-upload-url', args=[recipe_id])
+
+
 def detail_url(recipe_id):
     """Return recipe detail URL"""
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
-def sample_tag(user, name='Main course'):
-    """Create and return a sample tag"""
-    return Tag.objects.create(user=user, name=name)
-
-
-def sample_ingredient(user, name='Sugar'):
-    """Create and return a sample ingredient"""
-    return Ingredient.objects.create(user=user, name=name)
-
-
-def sample_recipe(user, **params):
-    """Create and return a sample recipe"""
-    defaults = {
-        'title': 'Sample recipe',
-        'time_minutes': 1,
-        'price': 5.50
-    }
-    defaults.update(params)
-
-    return Recipe.objects.create(user=user, **defaults)
-
-
 class PublicRecipesApiTests(TestCase):
     """Test the publicly available recipes API"""
 
@@ -67,11 +62,11 @@ class PublicRecipesApiTests(TestCase):
 class PrivateRecipesApiTests(TestCase):
     """Test authenticated user recipes API"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
     def setUp(self):
-        self.user = get_user_model().objects.create_user(
-            'test@example.com',
-            'password'
-        )
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -217,14 +212,173 @@ class PrivateRecipesApiTests(TestCase):
             self.assertEqual(payload[key], getattr(recipe, key))
         self.assertEqual(tags.count(), 0)
 
+    def test_update_tags_fixed_query_count(self):
+        """Test that updating tags does not query per added or removed tag"""
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(20)]
+
+        def run(count):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(*tags[:count])
+            payload = {'tags': [tag.id for tag in tags[count:count * 2]]}
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(
+                    detail_url(recipe.id), payload, format='json'
+                )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                set(recipe.tags.values_list('id', flat=True)),
+                set(payload['tags'])
+            )
+            return len(queries)
+
+        self.assertEqual(run(2), run(10))
+
+    def test_update_unknown_tag(self):
+        """Test that updating with an unknown tag is rejected"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.patch(
+            detail_url(recipe.id), {'tags': [9999]}, format='json'
+        )
 
-class RecipeImageUploadTests(TestCase):
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
-    def setUp(self):
-        self.user = get_user_model().objects.create_user(
-            'test@example.com',
+    def test_batch_retrieve_recipes(self):
+        """Test retrieving many recipe details in one request"""
+        user2 = get_user_model().objects.create_user(
+            'new@example.com',
             'password'
         )
+        recipe1 = sample_recipe(user=self.user, title='Bread')
+        recipe2 = sample_recipe(user=self.user, title='Cookies')
+        recipe2.tags.add(sample_tag(user=self.user))
+        other = sample_recipe(user=user2)
+
+        res = self.client.get(
+            BATCH_URL,
+            {'ids': f'{recipe2.id},{other.id},9999,{recipe1.id}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            RecipeDetailSerializer([recipe2, recipe1], many=True).data
+        )
+        self.assertEqual(res.data['missing'], [9999])
+        self.assertEqual(res.data['forbidden'], [other.id])
+
+    def test_batch_retrieve_fixed_query_count(self):
+        """Test that a batch read does not query per recipe"""
+        ids = []
+        for i in range(5):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(sample_ingredient(
+                user=self.user, name=f'Ingredient {i}'
+            ))
+            ids.append(recipe.id)
+
+        with self.assertNumQueries(3):
+            res = self.client.post(BATCH_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(len(res.data['results']), 5)
+
+    @override_settings(RECIPE_BATCH_MAX_IDS=2)
+    def test_batch_retrieve_limit(self):
+        """Test that a batch asking for too many recipes is rejected"""
+        res = self.client.get(BATCH_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_by_time_and_price(self):
+        """Test returning recipes within time and price ranges"""
+        quick = sample_recipe(user=self.user, time_minutes=10,
+                              price=Decimal('4.00'))
+        sample_recipe(user=self.user, time_minutes=60, price=Decimal('4.00'))
+        sample_recipe(user=self.user, time_minutes=10, price=Decimal('12.00'))
+
+        res = self.client.get(RECIPES_URL, {
+            'time_minutes__lte': 30,
+            'price__lte': '10.00',
+        })
+
+        self.assertEqual([r['id'] for r in res.data], [quick.id])
+
+    def test_order_recipes(self):
+        """Test ordering recipes by price, ties broken by id"""
+        recipe1 = sample_recipe(user=self.user, price=Decimal('8.00'))
+        recipe2 = sample_recipe(user=self.user, price=Decimal('2.00'))
+        recipe3 = sample_recipe(user=self.user, price=Decimal('8.00'))
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+
+        self.assertEqual(
+            [r['id'] for r in res.data],
+            [recipe3.id, recipe1.id, recipe2.id]
+        )
+
+    def test_invalid_recipe_filters(self):
+        """Test that unknown orderings and bad ranges are rejected"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'price__gte': 'cheap'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_params_ignored_by_detail(self):
+        """Test that list filters and ordering do not apply to one recipe"""
+        recipe = sample_recipe(user=self.user, price=5)
+        url = detail_url(recipe.id)
+
+        res = self.client.get(url, {'ordering': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.delete(f'{url}?price__lte=1')
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_recipes_keyset_pages(self):
+        """Test paging through recipes with a cursor"""
+        recipes = [
+            sample_recipe(user=self.user, time_minutes=minutes)
+            for minutes in (30, 10, 20, 10, 40)
+        ]
+        expected = sorted(recipes, key=lambda r: (r.time_minutes, r.id))
+
+        seen = []
+        url = f'{RECIPES_URL}?ordering=time_minutes&page_size=2'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [r['id'] for r in res.data['results']]
+            url = res.data['next']
+
+        self.assertEqual(seen, [recipe.id for recipe in expected])
+
+    def test_recipes_invalid_cursor(self):
+        """Test that a tampered cursor is not found"""
+        def cursor(data):
+            return urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for tampered in (
+                'nonsense',
+                cursor([1]),
+                cursor({'ordering': ['price', 'id'], 'values': ['x', 1]}),
+                cursor({'ordering': ['price', 'id'], 'values': [[], 1]}),
+                cursor({'ordering': ['price', 'id'], 'values': ['1']}),
+                cursor({'ordering': ['-price', 'id'],
+                        'values': ['1.00', 1]})):
+            res = self.client.get(RECIPES_URL, {'cursor': tampered,
+                                                'ordering': 'price'})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeImageUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
         self.client = APIClient()
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
@@ -246,6 +400,26 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_queues_variants(self):
+        """Test that resized copies are rendered in the background"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (1000, 500))
+            img.save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        variants = jobs.run_pending()[0].result
+        variants = json.loads(variants)
+        for name in variants.values():
+            with default_storage.open(name) as variant_file:
+                width, height = Image.open(variant_file).size
+            default_storage.delete(name)
+
+            self.assertLessEqual(width, 800)
+            self.assertEqual(width, height * 2)
+        self.assertEqual(set(variants), {'thumbnail', 'medium'})
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.recipe.id)
@@ -253,6 +427,125 @@ class RecipeImageUploadTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_image_too_large(self):
+        """Test that an upload over the size limit is rejected early"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.bmp') as ntf:
+            Image.new('RGB', (100, 100)).save(ntf, format='BMP')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=1000 * 1000)
+    def test_upload_image_too_many_pixels(self):
+        """Test that a small file decoding to a huge image is rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('1', (2000, 2000)).save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+    def test_upload_image_unsupported_format(self):
+        """Test that only allowed image formats are accepted"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.bmp') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='BMP')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_file_not_image(self):
+        """Test that a file which is not an image is rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'not an image at all')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _direct_upload(self, content):
+        """Presign a direct upload, send content to it and return token"""
+        res = self.client.post(
+            image_upload_url_url(self.recipe.id),
+            {'content_type': 'image/png'}
+        )
+        put = self.client.generic(
+            res.data['method'],
+            res.data['url'],
+            content,
+            content_type=res.data['headers']['Content-Type']
+        )
+
+        self.assertEqual(put.status_code, status.HTTP_200_OK)
+        return res.data['upload_token']
+
+    def test_direct_upload_image(self):
+        """Test uploading straight to storage and confirming the key"""
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='PNG')
+        token = self._direct_upload(buffer.getvalue())
+
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'upload_token': token}
+        )
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_direct_upload_not_image(self):
+        """Test that a direct upload which is not an image is discarded"""
+        token = self._direct_upload(b'not an image')
+        name = signing.loads(token, salt=uploads.UPLOAD_TOKEN_SALT)['name']
+
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'upload_token': token}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_direct_upload_token_for_other_recipe(self):
+        """Test that an upload token is only valid for its recipe"""
+        other = sample_recipe(user=self.user)
+        res = self.client.post(
+            image_upload_url_url(other.id),
+            {'content_type': 'image/png'}
+        )
+
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'upload_token': res.data['upload_token']}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_direct_upload_over_size_limit(self):
+        """Test that the storage emulator enforces the presigned size"""
+        res = self.client.post(
+            image_upload_url_url(self.recipe.id),
+            {'content_type': 'image/png'}
+        )
+        put = self.client.put(res.data['url'], b'x' * 100,
+                              content_type='image/png')
+
+        self.assertEqual(put.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
     def test_filter_recipes_by_tags(self):
         """Test returning recipes with specific tags"""
         recipe1 = sample_recipe(user=self.user, title='Breakfast cereal')
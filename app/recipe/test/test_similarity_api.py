@@ -0,0 +1,173 @@
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from core.tests.factories import sample_user, sample_recipe
+from recipe import similarity
+
+
+def similar_url(recipe_id):
+    """Return the similar recipes URL of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class SimilarityIndexTests(TestCase):
+    """Test scoring recipes against each other"""
+
+    def test_similar_ranks_by_jaccard(self):
+        """Test that recipes are ordered by similarity, then id"""
+        index = similarity.SimilarityIndex(
+            [1, 2, 3, 4, 5],
+            [0, 0, 0, 1, 1, 1, 2, 3, 3, 3, 3],
+            [1, 2, 3, 1, 2, 3, 1, 1, 2, 4, 5],
+        )
+
+        self.assertEqual(
+            index.similar(1, 10),
+            [(2, 1.0), (4, 0.4), (3, 1 / 3)]
+        )
+        self.assertEqual(index.similar(1, 1), [(2, 1.0)])
+        self.assertEqual(index.similar(5, 10), [])
+
+    def test_incremental_changes(self):
+        """Test adding and removing recipes and features in place"""
+        index = similarity.SimilarityIndex([1, 2], [0, 1], [1, 1])
+        index.add_pairs([3, 3], [1, 2])
+        index.add_pairs([1], [2])
+        index.remove_pairs([2], [1])
+
+        self.assertEqual(index.similar(1, 10), [(3, 1.0)])
+        index.remove_recipe(3)
+        self.assertEqual(index.similar(1, 10), [])
+
+
+class PrivateSimilarRecipesApiTests(TestCase):
+    """Test the similar recipes endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        similarity.invalidate(self.user.id)
+
+    def test_similar_recipes(self):
+        """Test listing recipes sharing tags and ingredients"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        kale = Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(vegan)
+        recipe.ingredients.add(salt, kale)
+        twin = sample_recipe(user=self.user)
+        twin.tags.add(vegan)
+        twin.ingredients.add(salt, kale)
+        close = sample_recipe(user=self.user)
+        close.ingredients.add(salt)
+        sample_recipe(user=self.user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [twin.id, close.id])
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+        self.assertEqual(res.data[1]['similarity'], 0.3333)
+
+    def test_similar_recipes_limit(self):
+        """Test that the limit query param is validated"""
+        recipe = sample_recipe(user=self.user)
+
+        res = self.client.get(similar_url(recipe.id), {'limit': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_recipes_of_other_user(self):
+        """Test that recipes of other users are not found"""
+        other = sample_user('other@example.com')
+        recipe = sample_recipe(user=other)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SimilarRecipesChangesApiTests(TransactionTestCase):
+    """Test that committed changes reach the index"""
+
+    def setUp(self):
+        self.user = sample_user('test@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        similarity.invalidate(self.user.id)
+
+    def test_similar_recipes_follow_changes(self):
+        """Test that the index is updated in place as recipes change"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        kale = Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(salt)
+        self.client.get(similar_url(recipe.id))
+
+        other = sample_recipe(user=self.user)
+        other.ingredients.add(salt, kale)
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'ingredients': [salt.id, kale.id]},
+            format='json'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual([r['id'] for r in res.data], [other.id])
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+        # Recipe lookup and the similar recipes, no index rebuild
+        self.assertEqual(len(queries), 4)
+
+        kale.delete()
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+        other.delete()
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data, [])
+
+    def test_rolled_back_change_not_applied(self):
+        """Test that changes are applied once committed only"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(salt)
+        other = sample_recipe(user=self.user)
+        self.client.get(similar_url(recipe.id))
+
+        try:
+            with transaction.atomic():
+                other.ingredients.add(salt)
+                raise ValueError
+        except ValueError:
+            pass
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.data, [])
+
+    @override_settings(RECIPE_SIMILARITY_MAX_AGE=0)
+    def test_old_index_rebuilt(self):
+        """Test that changes unseen by this process show up in time"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(salt)
+        self.client.get(similar_url(recipe.id))
+        other = sample_recipe(user=self.user)
+        # As written by a worker not sharing this process's cache
+        Recipe.ingredients.through.objects.bulk_create([
+            Recipe.ingredients.through(recipe=other, ingredient=salt)
+        ])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual([r['id'] for r in res.data], [other.id])
@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Tag, Ingredient, Job, RecipeStats
+from core.tests.factories import sample_user, sample_recipe
+from recipe import stats
+
+
+STATS_URL = reverse('recipe:stats')
+
+
+class StatsTests(TestCase):
+    """Test computing recipe summaries"""
+
+    def test_percentile(self):
+        """Test interpolating between the closest values"""
+        self.assertEqual(stats.percentile([1, 2, 3, 4], 0.5), 2.5)
+        self.assertEqual(stats.percentile([1, 2, 3, 4], 0.9), 3.7)
+        self.assertEqual(stats.percentile([7], 0.25), 7)
+
+
+class PrivateStatsApiTests(TestCase):
+    """Test the recipe stats endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats(self):
+        """Test summarizing the recipes of the user"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for minutes, price in ((10, '2.00'), (20, '4.00'), (30, '6.00')):
+            recipe = sample_recipe(user=self.user, time_minutes=minutes,
+                                   price=Decimal(price))
+            recipe.tags.add(vegan)
+        recipe.ingredients.add(salt)
+        sample_recipe(user=sample_user('other@example.com'))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['avg_time_minutes'], 20.0)
+        self.assertEqual(res.data['price_percentiles'], {
+            'p25': 3.0, 'p50': 4.0, 'p75': 5.0, 'p90': 5.6,
+        })
+        self.assertEqual(res.data['top_tags'], [
+            {'id': vegan.id, 'name': 'Vegan', 'recipes': 3},
+        ])
+        self.assertEqual(res.data['top_ingredients'], [
+            {'id': salt.id, 'name': 'Salt', 'recipes': 1},
+        ])
+        self.assertFalse(res.data['stale'])
+        self.assertIn('refreshed_at', res.data)
+
+    def test_stats_empty(self):
+        """Test the summary of a user without recipes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['avg_time_minutes'])
+        self.assertEqual(res.data['price_percentiles'], {})
+
+    def test_stats_refreshed_in_background(self):
+        """Test that changes mark the summary stale and queue one refresh"""
+        self.client.get(STATS_URL)
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user)
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertTrue(res.data['stale'])
+        refreshes = Job.objects.filter(task='recipe.refresh_stats')
+        self.assertEqual(refreshes.count(), 1)
+
+        Job.objects.update(run_after=refreshes.get().created_at)
+        jobs.run_pending()
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertFalse(res.data['stale'])
+
+    def test_no_refresh_without_summary(self):
+        """Test that users who never read their stats queue nothing"""
+        sample_recipe(user=self.user)
+
+        self.assertFalse(RecipeStats.objects.exists())
+        self.assertFalse(Job.objects.exists())
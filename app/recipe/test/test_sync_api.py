@@ -0,0 +1,154 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, Change
+from core.tests.factories import sample_user
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+class PublicSyncApiTests(TestCase):
+    """Test the publicly available sync API"""
+
+    def test_login_required(self):
+        """Test that login is required to sync"""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test the authorized user sync API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None):
+        params = {'since': since} if since else {}
+        res = self.client.get(SYNC_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_initial_sync_returns_library(self):
+        """Test that a sync without token returns all objects"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                       time_minutes=5, price=3)
+        recipe.tags.add(tag)
+
+        data = self.sync()
+
+        self.assertEqual([t['name'] for t in data['tags']['updated']],
+                         ['Vegan'])
+        self.assertEqual(len(data['ingredients']['updated']), 1)
+        self.assertEqual(data['recipes']['updated'][0]['tags'], [tag.id])
+        self.assertFalse(data['has_more'])
+
+    def test_sync_returns_only_changes(self):
+        """Test that a sync with a token only returns later changes"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                       time_minutes=5, price=3)
+        token = self.sync()['token']
+
+        recipe.title = 'Kale salad'
+        recipe.save()
+        tag = Tag.objects.create(user=self.user, name='Raw')
+        data = self.sync(token)
+
+        self.assertEqual([t['id'] for t in data['tags']['updated']],
+                         [tag.id])
+        self.assertEqual(data['recipes']['updated'][0]['title'],
+                         'Kale salad')
+        self.assertEqual(self.sync(data['token'])['tags']['updated'], [])
+
+    def test_sync_reports_deletions(self):
+        """Test that deleted objects are returned as tombstones"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Salad',
+                                       time_minutes=5, price=3)
+        recipe.tags.add(tag)
+        token = self.sync()['token']
+
+        tag_id = tag.id
+        tag.delete()
+        data = self.sync(token)
+
+        self.assertEqual(data['tags']['deleted'], [tag_id])
+        self.assertEqual(data['recipes']['updated'][0]['tags'], [])
+
+    def test_sync_limited_to_user(self):
+        """Test that changes of other users are not returned"""
+        user2 = get_user_model().objects.create_user(
+            'new@example.com',
+            'password'
+        )
+        Tag.objects.create(user=user2, name='Fruity')
+
+        self.assertEqual(self.sync()['tags']['updated'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_sync_pages_through_changes(self):
+        """Test that large change sets are returned in pages"""
+        for name in ('A', 'B', 'C'):
+            Tag.objects.create(user=self.user, name=name)
+
+        first = self.sync()
+        second = self.sync(first['token'])
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [t['name'] for t in first['tags']['updated'] +
+             second['tags']['updated']],
+            ['A', 'B', 'C']
+        )
+
+    def test_sync_invalid_token(self):
+        """Test that a malformed token is rejected"""
+        res = self.client.get(SYNC_URL, {'since': 'default.abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_holds_back_running_transactions(self):
+        """Test that changes which may skip uncommitted ones wait"""
+        for name, txid in (('A', 10), ('B', 20), ('C', 30)):
+            tag = Tag.objects.create(user=self.user, name=name)
+            Change.objects.filter(object_id=tag.id).update(txid=txid)
+
+        with patch('recipe.sync.running_transactions',
+                   return_value=(20, None)):
+            first = self.sync()
+        with patch('recipe.sync.running_transactions',
+                   return_value=(31, None)):
+            second = self.sync(first['token'])
+
+        self.assertEqual([t['name'] for t in first['tags']['updated']],
+                         ['A'])
+        self.assertFalse(first['has_more'])
+        self.assertEqual([t['name'] for t in second['tags']['updated']],
+                         ['B', 'C'])
+
+    def test_sync_returns_own_transaction(self):
+        """Test that changes of the reading transaction are returned"""
+        Tag.objects.create(user=self.user, name='A')
+        Change.objects.update(txid=10)
+
+        with patch('recipe.sync.running_transactions',
+                   return_value=(10, 10)):
+            data = self.sync()
+
+        self.assertEqual(len(data['tags']['updated']), 1)
@@ -7,6 +7,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from core.tests.factories import sample_user
 
 from ..serializers import TagSerializer
 
@@ -30,11 +31,11 @@ class PublicTagsApiTests(TestCase):
 class PrivateTagsApiTests(TestCase):
     """Test the authorized user tags API"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com')
+
     def setUp(self):
-        self.user = get_user_model().objects.create_user(
-            'test@example.com',
-            'password'
-        )
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -82,6 +83,42 @@ class PrivateTagsApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_tag_existing_name(self):
+        """Test creating a tag that exists returns the existing tag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.post(TAGS_URL, {'name': '  vegan '})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['id'], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_tags_bulk(self):
+        """Test creating many tags in one request"""
+        existing = Tag.objects.create(user=self.user, name='Dessert')
+        payload = [
+            {'name': 'Dessert'},
+            {'name': 'Quick  meal'},
+            {'name': 'quick meal'},
+            {'name': 'Vegan'},
+        ]
+        res = self.client.post(TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            ['Dessert', 'Quick meal', 'Vegan']
+        )
+        self.assertEqual(res.data[0]['id'], existing.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_create_tags_bulk_invalid(self):
+        """Test that one invalid name creates none of the tags"""
+        payload = [{'name': 'Vegan'}, {'name': ''}]
+        res = self.client.post(TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+
     def test_retrieve_tags_assigned_to_recipes(self):
         """Test filtering tags by those assigned to recipes"""
         tag1 = Tag.objects.create(user=self.user, name='Breakfast')
@@ -0,0 +1,168 @@
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions, status
+
+
+# Room for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+# Give up on identifying an image if its header is not found in this many
+# leading bytes
+MAX_HEADER_SIZE = 256 * 1024
+UPLOAD_TOKEN_SALT = 'recipe.uploads.direct'
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Uploaded image is too large.')
+    default_code = 'upload_too_large'
+
+
+def invalid_image(message):
+    """Return the validation error raised for a rejected image"""
+    return exceptions.ValidationError({'image': [message]})
+
+
+def sniff_image(header):
+    """Return format and size read from the leading bytes of an image
+
+    Only the header is parsed, pixel data is never decoded. Returns None
+    when the bytes seen so far are not enough to identify the image.
+    """
+    from PIL import Image
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            image = Image.open(BytesIO(header))
+    except Image.DecompressionBombError:
+        raise invalid_image(_('Image has too many pixels.'))
+    except OSError:
+        return None
+
+    return image.format, image.size
+
+
+def check_image_header(header):
+    """Return format and size of an image header allowed for recipes
+
+    Returns None while the header is incomplete.
+    """
+    sniffed = sniff_image(header)
+    if sniffed is None:
+        return None
+
+    image_format, (width, height) = sniffed
+    if image_format not in settings.RECIPE_IMAGE_FORMATS:
+        raise invalid_image(
+            _('Unsupported image format %s.') % image_format
+        )
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise invalid_image(_('Image has too many pixels.'))
+
+    return image_format, (width, height)
+
+
+def check_stored_image(storage, name):
+    """Validate an image uploaded straight to storage, return its format
+
+    Only the size and the leading bytes of the stored object are looked
+    at. Rejected objects are removed from storage.
+    """
+    if not storage.exists(name):
+        raise invalid_image(_('No file was uploaded.'))
+    try:
+        if storage.size(name) > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge()
+        header = storage.read_prefix(name, MAX_HEADER_SIZE)
+        sniffed = check_image_header(header)
+        if sniffed is None:
+            raise invalid_image(_('Upload a valid image.'))
+    except exceptions.APIException:
+        storage.delete(name)
+        raise
+
+    return sniffed[0]
+
+
+def make_upload_token(recipe, name):
+    """Sign the storage key a direct upload for a recipe goes to"""
+    return signing.dumps(
+        {'recipe': recipe.id, 'name': name},
+        salt=UPLOAD_TOKEN_SALT
+    )
+
+
+def read_upload_token(token, recipe):
+    """Return the storage key signed for a recipe, or None if invalid"""
+    try:
+        grant = signing.loads(
+            token,
+            salt=UPLOAD_TOKEN_SALT,
+            max_age=settings.MEDIA_UPLOAD_URL_EXPIRES
+        )
+    except signing.BadSignature:
+        return None
+
+    return grant['name'] if grant['recipe'] == recipe.id else None
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """Stream an uploaded recipe image to disk while enforcing limits
+
+    The request is rejected from its Content-Length before any of the body
+    is read, and again as soon as the streamed file passes the size limit.
+    Format and pixel count are checked from the image header, so memory use
+    stays bounded by the chunk size regardless of the file size.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        if content_length > max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra
+        )
+        self.header = b''
+        self.image_format = None
+        self.image_size = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge()
+        if self.image_format is None:
+            self.header += raw_data
+            self.sniff()
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.image_format is None:
+            raise invalid_image(_('Upload a valid image.'))
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.image_format = self.image_format
+        self.file.image_size = self.image_size
+
+        return self.file
+
+    def sniff(self):
+        """Identify the image once enough of its header has arrived"""
+        sniffed = check_image_header(self.header)
+        if sniffed is None:
+            if len(self.header) >= MAX_HEADER_SIZE:
+                raise invalid_image(_('Upload a valid image.'))
+            return
+
+        self.image_format, self.image_size = sniffed
+        self.header = b''
@@ -1,16 +1,19 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
 
 from recipe import views
+from recipe.routers import BulkRouter
 
 
-router = DefaultRouter()
+router = BulkRouter()
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
 router.register('recipes', views.RecipeViewSet)
+router.register('jobs', views.JobViewSet)
 
 app_name = 'recipe'
 
 urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
     path('', include(router.urls))
 ]
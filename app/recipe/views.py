@@ -1,16 +1,27 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.db.models import Count, F, Q, prefetch_related_objects
+from django.urls import reverse
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
+from rest_framework.views import APIView
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Tag, Ingredient, Recipe
+from core import jobs
+from core.sharding import ShardedViewMixin
+from core.models import Tag, Ingredient, Recipe, Job, RecipeStats, \
+    recipe_image_file_path
 
-from recipe import serializers
+from recipe import serializers, sync
+from recipe import bulk, purge, similarity, stats, uploads
+from recipe.pagination import KeysetPagination, RecipePagination
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
-                            mixins.CreateModelMixin):
+class BaseRecipeAttrViewSet(ShardedViewMixin, viewsets.GenericViewSet,
+                            mixins.ListModelMixin, mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -22,15 +33,44 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe__isnull=False,
+                                       recipe__deleted_at__isnull=True)
 
         return queryset.filter(
             user=self.request.user
         ).order_by('-name').distinct()
 
-    def perform_create(self, serializer):
-        """Create a new object"""
-        serializer.save(user=self.request.user)
+    def create(self, request, *args, **kwargs):
+        """Create one object, or many from a list, reusing existing names"""
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        items = serializer.validated_data if many else \
+            [serializer.validated_data]
+        if len(items) > settings.RECIPE_ATTR_BULK_MAX:
+            return Response(
+                {'non_field_errors': [
+                    f'Create at most {settings.RECIPE_ATTR_BULK_MAX} '
+                    f'objects at once.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        model = self.queryset.model
+        with transaction.atomic(using=router.db_for_write(model)):
+            objs = model.objects.get_or_create_many(
+                request.user,
+                [item['name'] for item in items]
+            )
+
+        return Response(
+            self.get_serializer(objs if many else objs[0], many=many).data,
+            status=status.HTTP_201_CREATED
+        )
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -45,19 +85,43 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ShardedViewMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
+    @property
+    def throttle_scope(self):
+        """Limit image uploads separately from other writes"""
+        if self.action in ('upload_image', 'image_upload_url'):
+            return 'upload'
+
+        return None
+
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
         return [int(i) for i in qs.split(',')]
 
+    @property
+    def paginator(self):
+        """Page the list by keyset when the client asks for a page size"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            paged = 'page_size' in params or 'cursor' in params
+            self._paginator = KeysetPagination() \
+                if self.action == 'list' and paged else None
+
+        return self._paginator
+
     def get_queryset(self):
-        """Retrieve recipes for the authenticated user"""
+        """Retrieve recipes for the authenticated user
+
+        When listing, range filters and the ordering come from query
+        params. Every ordering ends on the id so it is stable, and pairs
+        with one of the (user, field, id) indexes of the recipe table.
+        """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
@@ -67,8 +131,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        queryset = queryset.filter(user=self.request.user)
+        if self.action != 'list':
+            return queryset
+
+        params = serializers.RecipeFilterSerializer(
+            data=self.request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        ordering = filters.pop('ordering')
+        queryset = queryset.filter(**filters)
+        if ordering.lstrip('-') != 'id':
+            ordering = (ordering, '-id' if ordering[0] == '-' else 'id')
+        else:
+            ordering = (ordering,)
 
-        return queryset.filter(user=self.request.user)
+        return queryset.order_by(*ordering)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -83,10 +162,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Hide the recipe now, the purge job deletes it with its images"""
+        instance.soft_delete()
+        purge.schedule(self.request.user)
+
+    def bulk_update(self, request, *args, **kwargs):
+        """Replace the fields of many recipes in one request"""
+        return self._bulk_update(request, partial=False)
+
+    def bulk_partial_update(self, request, *args, **kwargs):
+        """Change some fields of many recipes in one request"""
+        return self._bulk_update(request, partial=True)
+
+    def _bulk_update(self, request, partial):
+        """Apply a list of `{id, ...fields}` items in one transaction
+
+        If any item is invalid nothing is changed and `errors` lists the
+        errors of every item, in the order of the request.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'non_field_errors': ['Expected a list of recipes.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.RECIPE_BULK_UPDATE_MAX:
+            return Response(
+                {'non_field_errors': [
+                    f'Update at most {settings.RECIPE_BULK_UPDATE_MAX} '
+                    f'recipes at once.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with transaction.atomic(using=router.db_for_write(Recipe)):
+                recipes = bulk.update_recipes(request.user, items, partial)
+        except bulk.BulkUpdateError as exc:
+            return Response(
+                {'errors': exc.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            serializers.RecipeSerializer(recipes, many=True).data,
+            status=status.HTTP_200_OK
+        )
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
+        request.upload_handlers = [uploads.RecipeImageUploadHandler(request)]
         recipe = self.get_object()
+        if 'upload_token' in request.data:
+            return self._confirm_image_upload(request, recipe)
+
         serializer = self.get_serializer(
             recipe,
             data=request.data
@@ -94,6 +225,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             serializer.save()
+            jobs.enqueue('recipe.image_variants', user=request.user,
+                         recipe_id=recipe.id)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -103,3 +236,246 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=True, url_path='image-upload-url')
+    def image_upload_url(self, request, pk=None):
+        """Presign an image upload that goes straight to media storage"""
+        recipe = self.get_object()
+        serializer = serializers.RecipeImageUploadUrlSerializer(
+            data=request.data
+        )
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        content_type = serializer.validated_data['content_type']
+        extension = serializers.IMAGE_CONTENT_TYPES[content_type]
+        name = recipe_image_file_path(recipe, f'image.{extension}')
+        upload = default_storage.presigned_upload(
+            name,
+            content_type,
+            settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        )
+        upload['url'] = request.build_absolute_uri(upload['url'])
+        upload['upload_token'] = uploads.make_upload_token(recipe, name)
+
+        return Response(upload, status=status.HTTP_200_OK)
+
+    def _confirm_image_upload(self, request, recipe):
+        """Record an image the client uploaded straight to storage"""
+        serializer = serializers.RecipeImageConfirmSerializer(
+            recipe,
+            data=request.data
+        )
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        uploads.check_stored_image(
+            default_storage,
+            serializer.validated_data['upload_token']
+        )
+        serializer.save()
+        jobs.enqueue('recipe.image_variants', user=request.user,
+                     recipe_id=recipe.id)
+
+        return Response(
+            serializers.RecipeImageSerializer(recipe).data,
+            status=status.HTTP_200_OK
+        )
+
+    @action(methods=['GET', 'POST'], detail=False)
+    def batch(self, request):
+        """Retrieve the details of many recipes in a fixed number of queries
+
+        Ids go in the `ids` query param as a comma separated list, or in
+        the `ids` list of a POST body.
+        """
+        if request.method == 'GET':
+            ids = request.query_params.get('ids', '')
+            data = {'ids': [i for i in ids.split(',') if i]}
+        else:
+            data = request.data
+        serializer = serializers.RecipeBatchSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = serializer.validated_data['ids']
+        found = {
+            recipe.id: recipe
+            for recipe in self.queryset.filter(id__in=ids)
+            .prefetch_related('tags', 'ingredients')
+        }
+        results = [
+            found[i] for i in ids
+            if i in found and found[i].user_id == request.user.id
+        ]
+
+        return Response({
+            'results': serializers.RecipeDetailSerializer(
+                results, many=True
+            ).data,
+            'missing': [i for i in ids if i not in found],
+            'forbidden': [
+                i for i in ids
+                if i in found and found[i].user_id != request.user.id
+            ],
+        })
+
+    @action(methods=['GET', 'POST'], detail=False)
+    def pantry(self, request):
+        """List recipes by how many of their ingredients are in a pantry
+
+        Ingredient ids go in the `ingredients` query param as a comma
+        separated list, or in the `ingredients` list of a POST body for
+        large pantries. Recipes missing the fewest ingredients come
+        first; `max_missing` leaves out those missing more. Coverage is
+        counted in one grouped query.
+        """
+        if request.method == 'GET':
+            data = request.query_params.dict()
+            data['ingredients'] = [
+                i for i in data.get('ingredients', '').split(',') if i
+            ]
+        else:
+            data = request.data
+        serializer = serializers.PantrySerializer(data=data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = serializer.validated_data['ingredients']
+        queryset = self.queryset.filter(user=request.user) \
+            .annotate(
+                total=Count('ingredients'),
+                matched=Count('ingredients', filter=Q(ingredients__in=ids))
+            ) \
+            .annotate(missing=F('total') - F('matched')) \
+            .filter(matched__gt=0)
+        max_missing = serializer.validated_data.get('max_missing')
+        if max_missing is not None:
+            queryset = queryset.filter(missing__lte=max_missing)
+        queryset = queryset.order_by('missing', '-matched', 'id')
+
+        paginator = RecipePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        prefetch_related_objects(page, 'tags', 'ingredients')
+
+        return paginator.get_paginated_response(
+            serializers.RecipePantrySerializer(page, many=True).data
+        )
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the recipes sharing the most tags and ingredients
+
+        Recipes are ranked by the Jaccard similarity of their tag and
+        ingredient sets, computed from an in memory index of the user's
+        library. Recipes sharing nothing are left out.
+        """
+        query = serializers.RecipeSimilarQuerySerializer(
+            data=request.query_params
+        )
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        recipe = self.get_object()
+        scores = similarity.get_index(request.user.id).similar(
+            recipe.id, query.validated_data['limit']
+        )
+        found = self.queryset.filter(user=request.user) \
+            .prefetch_related('tags', 'ingredients') \
+            .in_bulk([pk for pk, score in scores])
+        results = []
+        for pk, score in scores:
+            if pk in found:
+                found[pk].similarity = round(score, 4)
+                results.append(found[pk])
+
+        return Response(
+            serializers.RecipeSimilarSerializer(results, many=True).data
+        )
+
+    @action(methods=['POST'], detail=False)
+    def export(self, request):
+        """Queue an export of all recipes of the user"""
+        job = jobs.enqueue('recipe.export', user=request.user,
+                           user_id=request.user.id)
+
+        return job_accepted_response(request, job)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Report the status of background jobs queued by the user"""
+    queryset = Job.objects.all()
+    serializer_class = serializers.JobSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """Retrieve jobs for the authenticated user"""
+        return self.queryset.filter(user=self.request.user).order_by('-id')
+
+
+class SyncView(ShardedViewMixin, APIView):
+    """Return what changed in the user's library since a sync token"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """Return a page of changes after the `since` token"""
+        try:
+            changes = sync.changes_since(
+                request.user,
+                request.query_params.get('since')
+            )
+        except sync.InvalidToken:
+            return Response(
+                {'since': ['Invalid sync token.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(changes, status=status.HTTP_200_OK)
+
+
+class StatsView(ShardedViewMixin, APIView):
+    """Return a summary of the user's recipes"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """Return the stored summary, computing it on first use
+
+        `refreshed_at` tells when it was computed and `stale` whether
+        recipes changed since, a refresh is then already queued.
+        """
+        summary = RecipeStats.objects.filter(user=request.user).first()
+        if summary is None:
+            summary = stats.refresh(request.user.id)
+
+        return Response(
+            serializers.RecipeStatsSerializer(summary).data,
+            status=status.HTTP_200_OK
+        )
+
+
+def job_accepted_response(request, job):
+    """Return a 202 response pointing the client at the job status"""
+    location = request.build_absolute_uri(
+        reverse('recipe:job-detail', args=[job.id])
+    )
+
+    return Response(
+        serializers.JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': location}
+    )
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+
+from core import changelog, jobs, sharding
+from core.jobs import task
+from core.models import Tag, Ingredient, Recipe, Change
+
+from recipe import purge
+
+
+def schedule_delete(user):
+    """Deactivate a user, their data is deleted in the background"""
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    jobs.enqueue('user.delete', user_id=user.pk)
+
+
+@task('user.delete')
+def delete_user(user_id):
+    """Delete a deactivated user, their recipe data first in batches
+
+    Deleting the user row alone would cascade through every table in
+    one transaction; with the rows gone the cascade has nothing left to
+    lock for long.
+    """
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return {}
+
+    alias = sharding.shard_for_user(user)
+    token = sharding.use_shard(alias)
+    try:
+        with changelog.deleting(user.pk):
+            deleted = {
+                name: purge.delete_all(queryset.filter(user=user))
+                for name, queryset in (
+                    ('recipes', Recipe.all_objects.all()),
+                    ('tags', Tag.objects.all()),
+                    ('ingredients', Ingredient.objects.all()),
+                    ('changes', Change.objects.all()),
+                )
+            }
+    finally:
+        sharding.reset_shard(token)
+
+    if alias != 'default':
+        type(user).objects.using(alias).filter(pk=user.pk).delete()
+    user.delete()
+
+    return deleted
@@ -5,6 +5,10 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core import jobs
+from core.models import Tag, Recipe, Change, Job
+from core.tests.factories import sample_user, sample_recipe, sample_tag
+
 
 # here API URLs are defined
 CREATE_USER_URL = reverse('user:create')
@@ -12,11 +16,6 @@ TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
 
 
-# create user helper function
-def create_user(**params):
-    return get_user_model().objects.create_user(**params)
-
-
 class PublicUserApiTests(TestCase):
     """Test the users API (public)"""
 
@@ -54,7 +53,7 @@ class PublicUserApiTests(TestCase):
 
     def test_user_exists(self):
         """Test creating a user that already exists fails"""
-        create_user(**self.valid_payload)
+        sample_user(**self.valid_payload)
         res = self.client.post(CREATE_USER_URL, self.valid_payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -71,7 +70,7 @@ class PublicUserApiTests(TestCase):
 
     def test_create_token_for_user(self):
         """Test that a token is created for the user"""
-        create_user(**self.valid_payload)
+        sample_user(**self.valid_payload)
         res = self.client.post(TOKEN_URL, self.valid_payload)
 
         self.assertIn('token', res.data)
@@ -79,7 +78,7 @@ class PublicUserApiTests(TestCase):
 
     def test_create_token_invalid_credentials(self):
         """Test that token is not created if invalid credentials are given"""
-        create_user(**self.valid_payload)
+        sample_user(**self.valid_payload)
         res = self.client.post(TOKEN_URL, self.invalid_payload_password)
 
         self.assertNotIn('token', res.data)
@@ -119,14 +118,15 @@ class PublicUserApiTests(TestCase):
 class PrivateUserApiTests(TestCase):
     """Test API requests that require authentication"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user('test@example.com', name='Test Name')
+
     def setUp(self):
-        self.user = create_user(
-            email='test@example.com',
-            password='password',
-            name='Test Name'
-        )
+        # Tests change the shared user through the API
+        self.user.refresh_from_db()
         self.client = APIClient()
-        self.client.force_authenticate(user=self.user)
+        self.client.force_authenticate(self.user)
 
     def test_retrieve_profile_success(self):
         """Test retrieving profile for logged in user"""
@@ -153,3 +153,25 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_user(self):
+        """Test that a deleted user is deactivated, then purged by a job"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+        job, = jobs.run_pending()
+
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.all_objects.exists())
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Change.objects.exists())
@@ -3,6 +3,7 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
 from .serializers import UserSerializer, AuthTokenSerializer
+from .tasks import schedule_delete
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -14,9 +15,11 @@ class CreateAuthToken(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
     authentication_classes = (authentication.TokenAuthentication,)
@@ -25,3 +28,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         """Retrieve and return authenticated user"""
         return self.request.user
+
+    def perform_destroy(self, instance):
+        """Deactivate the user, their data is deleted in the background"""
+        schedule_delete(instance)